@@ -13,8 +13,6 @@ from operator import mul as multiply
 from os import path
 from typing import TYPE_CHECKING
 
-import pandas as pd
-
 module_directory = path.abspath(path.dirname(__file__))
 data_directory = path.join(module_directory, "data")
 # get correct path for datafiles when called from another directory
@@ -286,47 +284,36 @@ class Species(Element):
         self.oxidation = oxidation
         self.coordination = coordination
 
-        # Get shannon radius for the oxidation state and coordination.
+        # Get shannon and ionic radii for the oxidation state and coordination.
 
         self.shannon_radius = None
+        self.ionic_radius = None
+
+        # Get the average shannon and ionic radii
+        self.average_shannon_radius = None
+        self.average_ionic_radius = None
 
         if radii_source == "shannon":
-            shannon_data = data_loader.lookup_element_shannon_radius_data(symbol)
+            shannon_data = data_loader.lookup_element_shannon_radius_data(symbol, copy=False)
 
         elif radii_source == "extended":
-            shannon_data = data_loader.lookup_element_shannon_radius_data_extendedML(symbol)
+            shannon_data = data_loader.lookup_element_shannon_radius_data_extendedML(symbol, copy=False)
 
         else:
             shannon_data = None
             print("Data source not recognised. Please select 'shannon' or 'extended'. ")
 
         if shannon_data:
-            for dataset in shannon_data:
-                if dataset["charge"] == oxidation and str(coordination) == dataset["coordination"].split("_")[0]:
-                    self.shannon_radius = dataset["crystal_radius"]
-
-        # Get ionic radius
-        self.ionic_radius = None
-
-        if shannon_data:
-            for dataset in shannon_data:
-                if dataset["charge"] == oxidation and str(coordination) == dataset["coordination"].split("_")[0]:
-                    self.ionic_radius = dataset["ionic_radius"]
-
-        # Get the average shannon and ionic radii
-        self.average_shannon_radius = None
-        self.average_ionic_radius = None
-
-        if shannon_data:
-            # Get the rows of the shannon radius table for the element
-            shannon_data_df = pd.DataFrame(shannon_data)
-
-            # Get the rows corresponding to the oxidation state of the species
-            charge_rows = shannon_data_df.loc[shannon_data_df["charge"] == oxidation]
-
-            # Get the mean
-            self.average_shannon_radius = charge_rows["crystal_radius"].mean()
-            self.average_ionic_radius = charge_rows["ionic_radius"].mean()
+            radii = data_loader.lookup_species_shannon_radii(symbol, oxidation, coordination, radii_source)
+            if radii is not None:
+                self.shannon_radius, self.ionic_radius = radii
+
+            # The average is taken over all coordination environments;
+            # NaN if the element has no data for this oxidation state.
+            avg_radii = data_loader.lookup_species_average_shannon_radii(symbol, oxidation, radii_source)
+            self.average_shannon_radius, self.average_ionic_radius = (
+                avg_radii if avg_radii is not None else (float("nan"), float("nan"))
+            )
 
         # Get SSE_2015 (revised) for the oxidation state.
 
@@ -15,6 +15,7 @@ from __future__ import annotations
 import csv
 import os
 
+import numpy as np
 import pandas as pd
 
 from smact import data_directory
@@ -651,6 +652,109 @@ def lookup_element_shannon_radius_data_extendedML(symbol, copy=True):
         return None
 
 
+# Indexed Shannon radii, keyed by species and coordination number.
+
+_shannon_radii_index = {}
+
+
+def _get_shannon_radii_index(radii_source="shannon"):
+    """
+    Build (or fetch from the cache) the indexed Shannon radii for a data source.
+
+    Args:
+    ----
+        radii_source (str) : 'shannon' for the default Shannon radii set or
+            'extended' for the machine-learnt set.
+
+    Returns:
+    -------
+        tuple: A pair of dictionaries. The first maps
+        (symbol, charge, coordination number) to
+        (crystal_radius, ionic_radius); the second maps
+        (symbol, charge) to the radii averaged over all coordination
+        environments.
+
+    """
+    if radii_source in _shannon_radii_index:
+        return _shannon_radii_index[radii_source]
+
+    if radii_source == "shannon":
+        filename = "shannon_radii.csv"
+    elif radii_source == "extended":
+        filename = "shannon_radii_ML_extended.csv"
+    else:
+        raise ValueError(f"Unknown radii source '{radii_source}'. Choose 'shannon' or 'extended'.")
+
+    coord_radii = {}
+    charge_radii = {}
+
+    with open(os.path.join(data_directory, filename)) as file:
+        reader = csv.reader(file)
+
+        # Skip the first row (headers).
+
+        next(reader)
+
+        for row in reader:
+            symbol, charge = row[0], int(row[1])
+            radii = (float(row[3]), float(row[4]))
+
+            # Later rows take precedence, matching a linear scan of the data.
+            coord_radii[(symbol, charge, row[2].split("_")[0])] = radii
+            charge_radii.setdefault((symbol, charge), []).append(radii)
+
+    avg_radii = {
+        key: tuple(float(np.mean([radii[i] for radii in vals])) for i in range(2)) for key, vals in charge_radii.items()
+    }
+
+    _shannon_radii_index[radii_source] = (coord_radii, avg_radii)
+
+    return _shannon_radii_index[radii_source]
+
+
+def lookup_species_shannon_radii(symbol, charge, coordination, radii_source="shannon"):
+    """
+    Retrieve the Shannon radii of a species in a given coordination environment.
+
+    Args:
+    ----
+        symbol (str) : the atomic symbol of the element to look up.
+        charge (int) : the oxidation state of the species.
+        coordination (int or str) : the coordination number, e.g. 6.
+        radii_source (str) : 'shannon' or 'extended'.
+
+    Returns:
+    -------
+        tuple: (crystal_radius, ionic_radius), or None if the species
+        and coordination environment are not in the data.
+
+    """
+    coord_radii, _ = _get_shannon_radii_index(radii_source)
+
+    return coord_radii.get((symbol, charge, str(coordination)))
+
+
+def lookup_species_average_shannon_radii(symbol, charge, radii_source="shannon"):
+    """
+    Retrieve the Shannon radii of a species averaged over coordination environments.
+
+    Args:
+    ----
+        symbol (str) : the atomic symbol of the element to look up.
+        charge (int) : the oxidation state of the species.
+        radii_source (str) : 'shannon' or 'extended'.
+
+    Returns:
+    -------
+        tuple: (average crystal_radius, average ionic_radius), or None if
+        the species is not in the data.
+
+    """
+    _, avg_radii = _get_shannon_radii_index(radii_source)
+
+    return avg_radii.get((symbol, charge))
+
+
 # Loader and cache for the element solid-state energy (SSE) datasets.
 
 _element_ssedata = None
@@ -5,17 +5,21 @@ in multi-component solids. The search and ranking process is based on electronic
 
 from __future__ import annotations
 
+import multiprocessing
 import os
-from itertools import groupby
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING
 
 import numpy as np
 from pymatgen.util import plotting
 from tabulate import tabulate
 
-import smact
 from smact import data_directory
 from smact.structure_prediction import mutation, utilities
 
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
 SKIPSSPECIES_COSINE_SIM_PATH = os.path.join(
     data_directory,
     "species_rep/skipspecies_20221028_319ion_dim200_cosine_similarity.json",
@@ -28,6 +32,131 @@ SPECIES_M3GNET_MP2023_GAP_COSINE_PATH = os.path.join(
     data_directory, "species_rep/ion_embedding_M3GNet-MP-2023.11.1-oxi-band_gap_cosine_similarity.json"
 )
 
+_BUNDLED_EMBEDDING_PATHS = {
+    SKIPSSPECIES_COSINE_SIM_PATH,
+    SPECIES_M3GNET_MP2023_EFORM_COSINE_PATH,
+    SPECIES_M3GNET_MP2023_GAP_COSINE_PATH,
+}
+
+
+# Maximum number of distinct lambda tables kept by get_cation_mutator
+MUTATOR_CACHE_SIZE = 8
+
+
+def _resolve_lambda_path(filepath: str | None) -> str | None:
+    """
+    Get the file a lambda table should be read from.
+
+    For the bundled JSON embeddings, the pre-converted binary copy
+    shipped alongside them is used when present.
+
+    """
+    if filepath in _BUNDLED_EMBEDDING_PATHS:
+        bundled_binary = os.path.splitext(filepath)[0] + ".npz"
+        if os.path.exists(bundled_binary):
+            return bundled_binary
+
+    return filepath
+
+
+@lru_cache(maxsize=MUTATOR_CACHE_SIZE)
+def _cached_cation_mutator(filepath: str | None, mtime: float | None, alpha) -> mutation.CationMutator:
+    """Load a lambda table; cached on the path, its modification time and alpha."""
+    if filepath is not None and filepath.endswith(".npz"):
+        return mutation.CationMutator.load(filepath, alpha=alpha)
+
+    return mutation.CationMutator.from_json(filepath, alpha=alpha)
+
+
+def get_cation_mutator(
+    filepath: str | None = None,
+    alpha: Callable[[str, str], float] | float = -5.0,
+) -> mutation.CationMutator:
+    """
+    Get a fully populated :class:`~.CationMutator`, shared process-wide.
+
+    Mutators are cached on the lambda table's path, its modification time
+    and `alpha`, so creating many :class:`Doper` instances with the same
+    table only builds it once. At most :data:`MUTATOR_CACHE_SIZE` tables are
+    kept. Since the cache is a module-level object, worker processes
+    started with ``fork`` after a table has been loaded inherit it
+    copy-on-write.
+
+    Note:
+    ----
+        The returned instance is shared and must be treated as read-only.
+
+    Args:
+    ----
+        filepath (str): Path to a JSON lambda table, or to a binary table written
+            by :meth:`~.CationMutator.save` (``.npz``), which is memory-mapped.
+            If None, the default pymatgen table is used.
+        alpha: See :meth:`~.CationMutator.__init__`.
+
+    Returns:
+    -------
+        A :class:`~.CationMutator`.
+
+    """
+    filepath = _resolve_lambda_path(filepath)
+
+    if filepath is None:
+        return _cached_cation_mutator(None, None, alpha)
+
+    filepath = os.path.abspath(filepath)
+    return _cached_cation_mutator(filepath, os.path.getmtime(filepath), alpha)
+
+
+# Doper used by the worker processes of Doper.screen_hosts
+_screen_doper = None
+
+
+def _init_screen_worker(doper: Doper) -> None:
+    global _screen_doper
+    _screen_doper = doper
+
+
+def _screen_host_worker(
+    species: tuple[str, ...],
+    num_dopants: int,
+    get_selectivity: bool,
+    group_by_charge: bool,
+) -> list[dict]:
+    return _screen_doper._screen_host(species, num_dopants, get_selectivity, group_by_charge)
+
+
+def _iter_screen(
+    doper: Doper,
+    hosts: Iterable[tuple[str, ...]],
+    *,
+    num_dopants: int,
+    get_selectivity: bool,
+    group_by_charge: bool,
+    num_processes: int | None,
+    chunksize: int,
+) -> Iterator[dict]:
+    """Stream the records of :meth:`Doper.screen_hosts`."""
+    if num_processes == 1:
+        for species in hosts:
+            yield from doper._screen_host(tuple(species), num_dopants, get_selectivity, group_by_charge)
+        return
+
+    screen = partial(
+        _screen_host_worker,
+        num_dopants=num_dopants,
+        get_selectivity=get_selectivity,
+        group_by_charge=group_by_charge,
+    )
+
+    # Workers started with fork share the parent's Doper and lambda table copy-on-write
+    with multiprocessing.Pool(
+        processes=(multiprocessing.cpu_count() if num_processes is None else num_processes),
+        initializer=_init_screen_worker,
+        initargs=(doper,),
+    ) as pool:
+        for records in pool.imap(screen, (tuple(species) for species in hosts), chunksize=chunksize):
+            yield from records
+
 
 class Doper:
     """
@@ -45,10 +174,15 @@ class Doper:
         """
         Initialise the `Doper` class with a tuple of species.
 
+        The lambda table is obtained from :func:`get_cation_mutator`, so
+        instances using the same table share a single, read-only
+        :class:`~.CationMutator`.
+
         Args:
         ----
             original_species: See :class:`~.Doper`.
-            filepath (str): Path to a JSON file containing lambda table data.
+            filepath (str): Path to a JSON file containing lambda table data, or to a
+                binary lambda table written by :meth:`~.CationMutator.save`.
             embedding (str): Name of the species embedding to use. Currently only 'skipspecies' is supported.
             use_probability (bool): Whether to use the probability of substitution (calculated from `CationMutator`), or the raw similarity score/lambda value.
 
@@ -66,44 +200,64 @@ class Doper:
         ]:
             raise ValueError(f"Embedding {embedding} is not supported")
         if embedding == "skipspecies":
-            self.cation_mutator = mutation.CationMutator.from_json(SKIPSSPECIES_COSINE_SIM_PATH)
+            self.cation_mutator = get_cation_mutator(SKIPSSPECIES_COSINE_SIM_PATH)
         elif embedding == "M3GNet-MP-2023.11.1-oxi-Eform":
-            self.cation_mutator = mutation.CationMutator.from_json(SPECIES_M3GNET_MP2023_EFORM_COSINE_PATH)
+            self.cation_mutator = get_cation_mutator(SPECIES_M3GNET_MP2023_EFORM_COSINE_PATH)
         elif embedding == "M3GNet-MP-2023.11.1-oxi-band_gap":
-            self.cation_mutator = mutation.CationMutator.from_json(SPECIES_M3GNET_MP2023_GAP_COSINE_PATH)
+            self.cation_mutator = get_cation_mutator(SPECIES_M3GNET_MP2023_GAP_COSINE_PATH)
         elif filepath:
-            self.cation_mutator = mutation.CationMutator.from_json(filepath)
+            self.cation_mutator = get_cation_mutator(filepath)
         else:
             # Default to Hautier data-mined lambda values
-            self.cation_mutator = mutation.CationMutator.from_json(filepath)
+            self.cation_mutator = get_cation_mutator(filepath)
         self.possible_species = list(self.cation_mutator.specs)
         self.lambda_threshold = self.cation_mutator.alpha("X", "Y")
         self.threshold = 1 / self.cation_mutator.Z * np.exp(self.cation_mutator.alpha("X", "Y"))
         self.use_probability = use_probability
         self.results = None
+        # Dopant candidates of each host species, shared between calls
+        self._candidate_cache = {}
 
     def _get_selectivity(
         self,
-        data_list: list[smact.Element],
-        cations: list[smact.Element],
-        sub,
-    ):
-        data = data_list.copy()
-        for dopants in data:
-            if sub == "anion":
-                dopants.append(1.0)
-                continue
-            selected_site, original_specie, sub_prob = dopants[:3]
-            sum_prob = sub_prob
-            for cation in cations:
-                if cation != original_specie:
-                    sum_prob += self.cation_mutator.sub_prob(cation, selected_site)
-
-            selectivity = sub_prob / sum_prob
-            selectivity = round(selectivity, 2)
-            dopants.append(selectivity)
-            assert len(dopants) == 5
-        return data
+        candidates: dict[str, np.ndarray],
+        hosts: list[str],
+        cations: list[str],
+        sub: str,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Calculate the selectivity and combined score of dopant candidates.
+
+        The selectivity of a dopant for its site is its substitution probability
+        with the host, divided by the sum of that and its substitution
+        probabilities with the other host cations. Anion substitutions have a
+        selectivity of 1.
+
+        Args:
+        ----
+            candidates (dict): Dopant candidates, as returned by :meth:`_get_dopants`.
+            hosts (List[str]): The host species the candidates' 'host' indices refer to.
+            cations (List[str]): The cations of the host compound.
+            sub (str): The type of site substituted, "cation" or "anion".
+
+        Returns:
+        -------
+            Arrays of the selectivities and combined scores of the candidates.
+
+        """
+        lambdas = candidates["lambda"]
+        if sub == "anion" or len(lambdas) == 0:
+            selectivity = np.ones(len(lambdas))
+        else:
+            probs = candidates["prob"]
+            # Substitution probabilities of (dopant, host cation) pairs
+            cation_probs = np.stack([self._host_lambdas(cation)[1] for cation in cations], axis=1)
+            block = cation_probs[candidates["dopant"]]
+            own_site = np.array(cations)[np.newaxis, :] == np.array(hosts)[candidates["host"]][:, np.newaxis]
+            sum_probs = probs + np.where(own_site, 0.0, block).sum(axis=1)
+            selectivity = np.round(probs / sum_probs, 2)
+
+        return selectivity, self._calculate_combined_score(lambdas, selectivity)
 
     def _merge_dicts(self, keys, dopants_list, groupby_list):
         merged_dict = dict()
@@ -115,43 +269,120 @@ class Doper:
             merged_dict[k] = merged_values
         return merged_dict
 
+    def _host_lambdas(self, host: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the lambda values and substitution probabilities of a host species.
+
+        Args:
+        ----
+            host (str): The host species.
+
+        Returns:
+        -------
+            Arrays of the lambda values and substitution probabilities of the host
+            with every species in the lambda table, in lambda table order.
+
+        """
+        cm = self.cation_mutator
+        i = cm.spec_idx.get(host)
+        if i is not None:
+            return cm.lambda_mat[i], cm.exp_lambda_mat[i] / cm.Z
+
+        # Host not in the lambda table, so every pair is an alpha value
+        lambdas = np.array([cm.alpha(host, spec) for spec in cm.lambda_tab.index], dtype=np.float64)
+        return lambdas, np.exp(lambdas) / cm.Z
+
     def _get_dopants(
         self,
         specie_ions: list[str],
+        charges: list[int],
         ion_type: str,
-    ):
+    ) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray]]:
         """
-        Get possible dopants for a given list of elements and dopants.
+        Get possible dopants for a given list of host species.
+
+        Candidates are species in the lambda table whose charge is higher (n-type)
+        or lower (p-type) than the host's, without changing the sign of the site,
+        and whose substitution probability with the host exceeds the threshold.
 
         Args:
         ----
             specie_ions (List[str]): List of original species (anions or cations) as strings.
+            charges (List[int]): The charges of `specie_ions`.
             ion_type (str): Identify which species to check.
 
         Returns:
         -------
-            List[str]: List of possible dopants.
+            The n-type and p-type candidates, each as a dict of arrays with keys
+            'dopant' (lambda table index of the dopant), 'host' (index into
+            `specie_ions`), 'prob' and 'lambda'. Candidates are ordered by host,
+            then by lambda table order.
 
         """
-        poss_n_type = set()
-        poss_p_type = set()
-        for spec in self.possible_species:
-            _, state = utilities.parse_spec(spec)
-            for ion in specie_ions:
-                _, charge = utilities.parse_spec(ion)
+        n_type = {key: [] for key in ("dopant", "host", "prob", "lambda")}
+        p_type = {key: [] for key in ("dopant", "host", "prob", "lambda")}
+        for host_idx, (ion, charge) in enumerate(zip(specie_ions, charges, strict=True)):
+            for candidates, dopants in zip((n_type, p_type), self._host_candidates(ion, charge, ion_type), strict=True):
+                candidates["host"].append(np.full(len(dopants["dopant"]), host_idx))
+                for key, val in dopants.items():
+                    candidates[key].append(val)
+
+        return tuple(
+            {
+                key: np.concatenate(val) if val else np.array([], dtype=int if key in ("dopant", "host") else float)
+                for key, val in candidates.items()
+            }
+            for candidates in (n_type, p_type)
+        )
+
+    def _host_candidates(self, ion: str, charge: int, ion_type: str) -> tuple[dict, dict]:
+        """Get the n-type and p-type candidates of a single host; cached per host."""
+        key = (ion, charge, ion_type)
+        if key in self._candidate_cache:
+            return self._candidate_cache[key]
+
+        spec_charges = self.cation_mutator.spec_charges
+        lambdas, probs = self._host_lambdas(ion)
+        # Compare lambdas rather than probabilities, so rounding in Z cannot
+        # let pairs at the alpha floor past the threshold
+        likely = lambdas > self.lambda_threshold
+
+        if ion_type == "anion":
+            n_mask = (spec_charges > charge) & (spec_charges < 0)
+            p_mask = spec_charges < charge
+        elif ion_type == "cation":
+            n_mask = spec_charges > charge
+            p_mask = (spec_charges < charge) & (spec_charges > 0)
+
+        candidates = []
+        for mask in (n_mask, p_mask):
+            (dopants,) = np.nonzero(mask & likely)
+            candidates.append({"dopant": dopants, "prob": probs[dopants], "lambda": lambdas[dopants]})
+
+        self._candidate_cache[key] = tuple(candidates)
+        return self._candidate_cache[key]
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        Get the positions of the `k` highest scores, highest first.
 
-                if ion_type == "anion":
-                    if state > charge and state < 0:
-                        poss_n_type.add(spec)
-                    elif state < charge:
-                        poss_p_type.add(spec)
-                elif ion_type == "cation":
-                    if state > charge:
-                        poss_n_type.add(spec)
-                    elif state < charge and state > 0:
-                        poss_p_type.add(spec)
+        Equal scores keep their original order, as with a stable sort, but
+        only the selected scores are sorted.
 
-        return list(poss_n_type), list(poss_p_type)
+        """
+        if k <= 0:
+            return np.array([], dtype=int)
+
+        if k < len(scores):
+            kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+            above = np.flatnonzero(scores > kth)
+            ties = np.flatnonzero(scores == kth)[: k - len(above)]
+            top = np.sort(np.concatenate([above, ties]))
+        else:
+            top = np.arange(len(scores))
+
+        return top[np.argsort(-scores[top], kind="stable")]
 
     def get_dopants(self, num_dopants: int = 5, get_selectivity=True, group_by_charge=True) -> dict:
         """
@@ -168,122 +399,78 @@ class Doper:
             dict: A dictionary of the top n dopants for each case.
 
         """
+        self.results = self._rank_dopants(self.original_species, num_dopants, get_selectivity, group_by_charge)
+        self.len_list = 6 if get_selectivity else 4
+
+        # return the top (num_dopants) results for each case
+        return self.results
+
+    def _rank_dopants(
+        self,
+        original_species: tuple[str, ...],
+        num_dopants: int,
+        get_selectivity: bool,
+        group_by_charge: bool,
+    ) -> dict:
+        """Get the top n dopants for each case, without storing the results."""
         cations, anions = [], []
+        cation_charges, anion_charges = [], []
 
-        for ion in self.original_species:
+        for ion in original_species:
             try:
                 _, charge = utilities.parse_spec(ion)
                 if charge > 0:
                     cations.append(ion)
+                    cation_charges.append(charge)
                 elif charge < 0:
                     anions.append(ion)
+                    anion_charges.append(charge)
             except Exception as e:
                 print(f"{e}: charge is not defined for {ion}!")
 
-        CM = self.cation_mutator
-
-        poss_n_type_cat, poss_p_type_cat = self._get_dopants(cations, "cation")
-        poss_n_type_an, poss_p_type_an = self._get_dopants(anions, "anion")
-
-        n_type_cat, p_type_cat, n_type_an, p_type_an = [], [], [], []
-        for cation in cations:
-            cation_charge = utilities.parse_spec(cation)[1]
-
-            for _i, n_specie in enumerate(poss_n_type_cat):
-                n_specie_charge = utilities.parse_spec(n_specie)[1]
-                if cation_charge >= n_specie_charge:
-                    continue
-                if CM.sub_prob(cation, n_specie) > self.threshold:
-                    n_type_cat.append(
-                        [
-                            n_specie,
-                            cation,
-                            self.cation_mutator.sub_prob(cation, n_specie),
-                            self.cation_mutator.get_lambda(cation, n_specie),
-                        ]
-                    )
-            for p_specie in poss_p_type_cat:
-                p_specie_charge = utilities.parse_spec(p_specie)[1]
-                if cation_charge <= p_specie_charge:
-                    continue
-                if CM.sub_prob(cation, p_specie) > self.threshold:
-                    p_type_cat.append(
-                        [
-                            p_specie,
-                            cation,
-                            self.cation_mutator.sub_prob(cation, p_specie),
-                            self.cation_mutator.get_lambda(cation, p_specie),
-                        ],
-                    )
-        for anion in anions:
-            anion_charge = utilities.parse_spec(anion)[1]
-
-            for n_specie in poss_n_type_an:
-                n_specie_charge = utilities.parse_spec(n_specie)[1]
-                if anion_charge >= n_specie_charge:
-                    continue
-                if CM.sub_prob(anion, n_specie) > self.threshold:
-                    n_type_an.append(
-                        [
-                            n_specie,
-                            anion,
-                            self.cation_mutator.sub_prob(anion, n_specie),
-                            self.cation_mutator.get_lambda(anion, n_specie),
-                        ]
-                    )
-            for p_specie in poss_p_type_an:
-                p_specie_charge = utilities.parse_spec(p_specie)[1]
-                if anion_charge <= p_specie_charge:
-                    continue
-                if CM.sub_prob(anion, p_specie) > self.threshold:
-                    p_type_an.append(
-                        [
-                            p_specie,
-                            anion,
-                            self.cation_mutator.sub_prob(anion, p_specie),
-                            self.cation_mutator.get_lambda(anion, p_specie),
-                        ]
-                    )
-        dopants_lists = [n_type_cat, p_type_cat, n_type_an, p_type_an]
-
-        # sort by probability
-        for dopants_list in dopants_lists:
-            dopants_list.sort(key=lambda x: x[2], reverse=True)
-
-        self.len_list = 4
-        if get_selectivity:
-            self.len_list = 6
-            for i in range(len(dopants_lists)):
-                sub = "cation"
-                if i > 1:
-                    sub = "anion"
-                dopants_lists[i] = self._get_selectivity(dopants_lists[i], cations, sub)
-
-            for dopants_list in dopants_lists:
-                for dopant in dopants_list:
-                    similarity = dopant[3]
-                    selectivity = dopant[4]
-                    combined_score = self._calculate_combined_score(similarity, selectivity)
-                    dopant.append(combined_score)
-
-            # sort by combined score
-            for dopants_list in dopants_lists:
-                dopants_list.sort(key=lambda x: x[5], reverse=True)
-
-        # if groupby
-        groupby_lists = [dict()] * 4  # create list of empty dict length of 4 (n-cat, p-cat, n-an, p-an)
-        # in case group_by_charge = False
-        if group_by_charge:
-            for i, dl in enumerate(dopants_lists):
-                # groupby first element charge
-                dl = sorted(dl, key=lambda x: utilities.parse_spec(x[0])[1])
-                grouped_data = groupby(dl, key=lambda x: utilities.parse_spec(x[0])[1])
-                grouped_top_data = {str(k): list(g)[:num_dopants] for k, g in grouped_data}
-                groupby_lists[i] = grouped_top_data
-                del grouped_data
-
-        # select top n elements
-        dopants_lists = [dopants_list[:num_dopants] for dopants_list in dopants_lists]
+        # n-type cation, p-type cation, n-type anion, p-type anion
+        candidates_list = [
+            *self._get_dopants(cations, cation_charges, "cation"),
+            *self._get_dopants(anions, anion_charges, "anion"),
+        ]
+        hosts_list = [cations, cations, anions, anions]
+
+        labels = self.cation_mutator.lambda_tab.index
+
+        dopants_lists, groupby_lists = [], []
+        for i, (candidates, hosts) in enumerate(zip(candidates_list, hosts_list, strict=True)):
+            probs = candidates["prob"]
+
+            columns = [
+                [labels[d] for d in candidates["dopant"]],
+                [hosts[h] for h in candidates["host"]],
+                probs,
+                candidates["lambda"],
+            ]
+
+            if get_selectivity:
+                sub = "cation" if i < 2 else "anion"
+                columns.extend(self._get_selectivity(candidates, hosts, cations, sub))
+
+                # Rank by combined score, breaking ties by probability
+                ranking = np.argsort(-probs, kind="stable")
+                scores = columns[5]
+            else:
+                ranking = np.arange(len(probs))
+                scores = probs
+
+            def make_rows(idx, columns=columns):
+                return [[col[j] for col in columns] for j in idx]
+
+            dopants_lists.append(make_rows(ranking[self._top_k(scores[ranking], num_dopants)]))
+
+            groups = {}
+            if group_by_charge:
+                dopant_charges = self.cation_mutator.spec_charges[candidates["dopant"]]
+                for charge in np.unique(dopant_charges):
+                    members = ranking[dopant_charges[ranking] == charge]
+                    groups[str(charge)] = make_rows(members[self._top_k(scores[members], num_dopants)])
+            groupby_lists.append(groups)
 
         keys = [
             "n-type cation substitutions",
@@ -292,10 +479,101 @@ class Doper:
             "p-type anion substitutions",
         ]
 
-        self.results = self._merge_dicts(keys, dopants_lists, groupby_lists)
+        return self._merge_dicts(keys, dopants_lists, groupby_lists)
 
-        # return the top (num_dopants) results for each case
-        return self.results
+    def _screen_host(
+        self,
+        species: tuple[str, ...],
+        num_dopants: int,
+        get_selectivity: bool,
+        group_by_charge: bool,
+    ) -> list[dict]:
+        """Rank the dopants of one host and flatten them into records."""
+        fields = ["dopant", "site", "probability", "similarity"]
+        if get_selectivity:
+            fields += ["selectivity", "combined"]
+
+        records = []
+        results = self._rank_dopants(species, num_dopants, get_selectivity, group_by_charge)
+        for dopant_type, dopants in results.items():
+            for group, rows in dopants.items():
+                for rank, row in enumerate(rows, start=1):
+                    record = {"host": species, "type": dopant_type, "group": group, "rank": rank}
+                    record.update(zip(fields, row, strict=True))
+                    records.append(record)
+        return records
+
+    @classmethod
+    def screen_hosts(
+        cls,
+        hosts: Iterable[tuple[str, ...]],
+        num_dopants: int = 5,
+        get_selectivity: bool = True,
+        group_by_charge: bool = False,
+        *,
+        filepath: str | None = None,
+        embedding: str | None = None,
+        num_processes: int | None = 1,
+        chunksize: int = 16,
+    ) -> Iterator[dict]:
+        """
+        Screen the dopants of many hosts, streaming the results as records.
+
+        All hosts share one lambda table, which is loaded when this is
+        called, and the dopant candidates of each host species are only
+        computed once per process. With more than one process, hosts are
+        distributed over a :class:`multiprocessing.Pool`; records are still
+        yielded in the order of `hosts`.
+
+        Each record is a dict with the keys 'host' (the species tuple),
+        'type' (e.g. 'n-type cation substitutions'), 'group' ('sorted', or the
+        dopant charge when grouping by charge), 'rank', 'dopant', 'site',
+        'probability' and 'similarity', plus 'selectivity' and 'combined'
+        when `get_selectivity` is True. The records can be collected with
+        ``pd.DataFrame.from_records(Doper.screen_hosts(hosts))``, or written
+        out in chunks, e.g. to Parquet, for large screens.
+
+        Args:
+        ----
+            hosts (Iterable[Tuple[str, ...]]): The species tuples of the hosts.
+            num_dopants (int): The number of dopants to return for each case.
+            get_selectivity (bool): Whether to calculate the selectivity of the dopants.
+            group_by_charge (bool): Whether to also return the top dopants of each charge.
+            filepath (str): See :class:`~.Doper`.
+            embedding (str): See :class:`~.Doper`.
+            num_processes (int): The number of processes to use. If None,
+                the number of CPUs is used. Defaults to 1, which runs in
+                the calling process.
+            chunksize (int): The number of hosts sent to a worker at once.
+
+        Returns:
+        -------
+            An iterator of dicts, one record per suggested dopant.
+
+        Raises:
+        ------
+            ValueError: The lambda table options are invalid, see
+                :class:`~.Doper`, or `num_processes` or `chunksize` is
+                less than 1.
+
+        """
+        if num_processes is not None and num_processes < 1:
+            raise ValueError(f"num_processes must be at least 1 or None, not {num_processes}.")
+        if chunksize < 1:
+            raise ValueError(f"chunksize must be at least 1, not {chunksize}.")
+
+        # Load the lambda table before any workers are started
+        doper = cls((), filepath=filepath, embedding=embedding)
+
+        return _iter_screen(
+            doper,
+            hosts,
+            num_dopants=num_dopants,
+            get_selectivity=get_selectivity,
+            group_by_charge=group_by_charge,
+            num_processes=num_processes,
+            chunksize=chunksize,
+        )
 
     def plot_dopants(self, cmap: str = "YlOrRd", plot_value: str = "probability") -> None:
         """
@@ -3,33 +3,176 @@
 from __future__ import annotations
 
 import itertools
-from operator import itemgetter
-
-try:
-    from pathos.pools import ParallelPool
-
-    pathos_available = True
-
-except ImportError:
-    pathos_available = False
-    ParallelPool = None
-
+import multiprocessing
 import os
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from fnmatch import fnmatchcase
+from functools import partial
+from operator import itemgetter
 from typing import TYPE_CHECKING
 
 from pymatgen.core import SETTINGS
+from pymatgen.core import Structure as pmg_Structure
 from pymatgen.ext.matproj import MPRester
 
 from . import logger
-from .structure import SmactStructure
-from .utilities import get_sign
+from .structure import DecorationError, SmactStructure, py_struct_digest
+from .utilities import charge_pattern, get_sign, prototype_key
 
 if TYPE_CHECKING:
-    from collections.abc import Sequence
+    from collections.abc import Callable, Iterable, Iterator, Sequence
 
+    import numpy as np
     import pymatgen
 
+# Pragmas applied to persistent connections, tuned for read-heavy workloads
+PERSISTENT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024**2,
+    # Negative values are in KiB
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+# Encodings in which structures can be stored
+STRUCTURE_FORMATS = ("poscar", "binary")
+
+# Matches one species of a composition key, see SmactStructure.composition
+_COMPOSITION_RE = re.compile(r"([A-Za-z]+)_(\d+)_(\d+)([+-]?)")
+
+
+def _structure_size(struct: SmactStructure) -> int:
+    """Roughly estimate the memory used by a decoded structure, in bytes."""
+    # The site arrays, plus the species, lattice and array headers
+    return struct.coords.nbytes + struct.site_species.nbytes + 200 * len(struct.species) + 600
+
+
+class StructureCache:
+    """
+    A thread-safe LRU cache of decoded structures.
+
+    Structures are keyed by their table and rowid. The cache is bounded
+    both in the number of structures and in their estimated memory use.
+
+    Note:
+    ----
+        Cached structures are shared between everything that reads them,
+        so must not be modified.
+
+    Attributes:
+    ----------
+        max_structs: The maximum number of structures kept.
+        max_bytes: The maximum estimated memory use of the kept structures,
+            or None for no limit.
+        hits: The number of lookups that found a structure.
+        misses: The number of lookups that did not find a structure.
+        evictions: The number of structures evicted to stay within bounds.
+
+    """
+
+    def __init__(self, max_structs: int = 10000, max_bytes: int | None = None):
+        """
+        Initialise an empty cache.
+
+        Args:
+        ----
+            max_structs (int): See :class:`StructureCache`.
+            max_bytes (int): See :class:`StructureCache`.
+
+        """
+        self.max_structs = max_structs
+        self.max_bytes = max_bytes
+        self._structs: OrderedDict[tuple[str, int], tuple[SmactStructure, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        """Get the number of cached structures."""
+        return len(self._structs)
+
+    def get(self, table: str, rowid: int) -> SmactStructure | None:
+        """Get a cached structure, or None if it is not cached."""
+        with self._lock:
+            entry = self._structs.get((table, rowid))
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._structs.move_to_end((table, rowid))
+            self.hits += 1
+            return entry[0]
+
+    def put(self, table: str, rowid: int, struct: SmactStructure):
+        """Add a structure, evicting the least recently used ones if needed."""
+        size = _structure_size(struct)
+        with self._lock:
+            old = self._structs.pop((table, rowid), None)
+            if old is not None:
+                self._bytes -= old[1]
+
+            self._structs[table, rowid] = (struct, size)
+            self._bytes += size
+            while self._structs and (
+                len(self._structs) > self.max_structs or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                _, (_, evicted_size) = self._structs.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, table: str | None = None, rowids: Iterable[int] | None = None):
+        """
+        Remove structures from the cache.
+
+        Args:
+        ----
+            table: The table whose structures to remove. If None,
+                the whole cache is cleared.
+            rowids: The rowids of the structures to remove. If None,
+                all structures of `table` are removed.
+
+        """
+        with self._lock:
+            if table is None:
+                keys = list(self._structs)
+            elif rowids is None:
+                keys = [key for key in self._structs if key[0] == table]
+            else:
+                keys = [(table, rowid) for rowid in rowids]
+
+            for key in keys:
+                entry = self._structs.pop(key, None)
+                if entry is not None:
+                    self._bytes -= entry[1]
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Get the cache statistics.
+
+        Returns:
+        -------
+            A dict of the number of 'hits', 'misses' and 'evictions', the
+            'hit_rate', the number of cached 'structs' and their estimated
+            memory use in 'bytes'.
+
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "structs": len(self._structs),
+                "bytes": self._bytes,
+            }
+
 
 class StructureDB:
     """
@@ -39,11 +182,43 @@ class StructureDB:
     and wraps several useful SQLite commands within
     methods.
 
+    By default, a new connection is opened and closed every time the
+    database is used as a context manager. In persistent mode, each thread
+    instead keeps one long-lived connection, which is reused for every
+    operation, along with SQLite's per-connection cache of prepared
+    statements. Persistent connections stay open until :meth:`close`
+    is called. Processes forked from one with open connections, e.g. pool
+    workers, do not use them, but open their own.
+
+    Structures are stored either as POSCAR strings (see
+    :meth:`~.SmactStructure.as_poscar`) or in a compact binary encoding (see
+    :meth:`~.SmactStructure.as_bytes`), which is much faster to read. The
+    encoding is chosen per database instance for writing; both are always
+    read, so tables may mix them. :meth:`convert_structures` re-encodes
+    existing tables.
+
+    Decoded structures can be kept in a :class:`StructureCache`, so that
+    structures read repeatedly, e.g. by overlapping species queries during
+    structure prediction, are only decoded once. Writes made through the
+    instance invalidate the affected entries; writes made by other
+    connections are not detected, see :meth:`invalidate_cache`.
+
+    Each structure table ``<table>`` is accompanied by a normalised
+    ``<table>_species`` table of (structure_id, element, charge, stoichiometry)
+    rows, where structure_id is the rowid of the structure. Its indexes allow
+    :meth:`get_with_species` to find structures without scanning the
+    compositions of the whole table. A ``<table>_prototypes`` table likewise
+    indexes structures by their anonymised charges and stoichiometry, see
+    :meth:`get_with_prototype`. Tables created before these tables were
+    introduced can be indexed with :meth:`index_species`.
+
     Attributes:
     ----------
         db: The database name.
+        persistent: Whether connections are kept open between operations.
+        pragmas: The pragmas set on each new connection.
         conn: The database connection. Only open when
-            used as a context manager.
+            used as a context manager, or in persistent mode.
         cur: The database connection cursor. Only usable
             when class implemented as context manager.
 
@@ -63,17 +238,130 @@ class StructureDB:
 
     """
 
-    def __init__(self, db: str):
+    def __init__(
+        self,
+        db: str,
+        persistent: bool = False,
+        pragmas: dict[str, str | int] | None = None,
+        *,
+        structure_format: str = "poscar",
+        compress: bool = False,
+        cache_size: int = 0,
+        cache_bytes: int | None = None,
+    ):
         """
         Set database name.
 
         Args:
         ----
             db (str): The name of the database. Can also be ':memory:'
-                to connect to a database in RAM.
+                to connect to a database in RAM. In-memory databases are
+                private to a connection, so are only kept between operations
+                in persistent mode, and then only within one thread.
+            persistent (bool): Whether to keep one open connection per thread,
+                rather than connecting for each operation. Defaults to False.
+            pragmas (dict): Pragmas to set on each new connection, as
+                ``{name: value}``. Defaults to :data:`PERSISTENT_PRAGMAS` in
+                persistent mode, and to none otherwise.
+            structure_format (str): How structures are written, either "poscar"
+                or "binary". Defaults to "poscar".
+            compress (bool): Whether to compress binary structures.
+                Defaults to False.
+            cache_size (int): The maximum number of decoded structures to
+                cache. Defaults to 0, which disables the cache. Cached
+                structures are shared, so must not be modified.
+            cache_bytes (int): The maximum estimated memory use of the cache,
+                in bytes. Defaults to None, for no limit.
 
         """
+        if structure_format not in STRUCTURE_FORMATS:
+            raise ValueError(f"Unknown structure format {structure_format!r}, expected one of {STRUCTURE_FORMATS}.")
+
         self.db = db
+        self.structure_format = structure_format
+        self.compress = compress
+        self.cache = StructureCache(cache_size, cache_bytes) if cache_size > 0 else None
+        self.persistent = persistent
+        if pragmas is None:
+            pragmas = PERSISTENT_PRAGMAS if persistent else {}
+        self.pragmas = dict(pragmas)
+
+        self._reset_connections()
+        # Whether each structure table has a species table
+        self._species_tables: dict[str, bool] = {}
+
+    def _reset_connections(self):
+        """Forget the pooled connections, e.g. in a new process."""
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _check_fork(self):
+        """Stop using the pooled connections of the parent in a forked process."""
+        if self._pid != os.getpid():
+            # SQLite connections must not be used, or closed, across fork(),
+            # so keep the inherited ones referenced and open new ones
+            self._inherited_connections = self._connections
+            self._reset_connections()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection and apply the pragmas."""
+        # Pooled connections are only used by the thread that opened them,
+        # but may be closed by another
+        conn = sqlite3.connect(self.db, check_same_thread=not self.persistent)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Get the calling thread's connection, opening one if needed."""
+        if not self.persistent:
+            return self._connect()
+
+        self._check_fork()
+        conn = getattr(self._local, "pooled", None)
+        if conn is None:
+            conn = self._local.pooled = self._connect()
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """
+        Close all persistent connections.
+
+        The database can still be used afterwards, in which case new
+        connections are opened.
+
+        """
+        self._check_fork()
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+
+        for conn in connections:
+            conn.close()
+
+    def __getstate__(self) -> dict:
+        """
+        Get the settings of the database for pickling.
+
+        Connections are not pickled, and the cache is pickled empty, so that
+        an unpickled database, e.g. in a worker process, opens its own.
+
+        """
+        state = self.__dict__.copy()
+        for attr in ("_pid", "_local", "_connections", "_inherited_connections", "_lock", "conn", "cur"):
+            state.pop(attr, None)
+        if self.cache is not None:
+            state["cache"] = StructureCache(self.cache.max_structs, self.cache.max_bytes)
+        return state
+
+    def __setstate__(self, state: dict):
+        """Restore the settings of a pickled database."""
+        self.__dict__.update(state)
+        self._reset_connections()
 
     def __enter__(self) -> sqlite3.Cursor:
         """
@@ -84,7 +372,7 @@ class StructureDB:
             An SQLite cursor for interfacing with the database.
 
         """
-        self.conn = sqlite3.connect(self.db)
+        self.conn = self._local.active = self._get_connection()
         self.cur = self.conn.cursor()
 
         return self.cur
@@ -98,22 +386,43 @@ class StructureDB:
         was raised, causing the context to be exited.
 
         """
+        conn = self._local.active
         if exc_type is not None:
-            self.conn.rollback()
+            conn.rollback()
         else:
-            self.conn.commit()
+            conn.commit()
 
-        self.conn.close()
+        if not self.persistent:
+            conn.close()
 
     def add_mp_icsd(
         self,
         table: str,
-        mp_data: list[dict[str, pymatgen.core.Structure | str]] | None = None,
+        mp_data: Iterable[dict[str, pymatgen.core.Structure | str]] | None = None,
         mp_api_key: str | None = None,
+        *,
+        determine_oxi: str = "BV",
+        num_processes: int | None = None,
+        chunksize: int = 64,
+        batch_size: int = 1000,
     ) -> int:
         """
         Add a table populated with Materials Project-hosted ICSD structures.
 
+        Structures are decorated with oxidation states on a process pool, in
+        chunks, with a bounded number of chunks in flight, and are inserted
+        in batches as they are decorated. Apart from a record of each material
+        already in the table, memory use does not grow with the size of
+        the dataset, and `mp_data` may be a generator.
+
+        The outcome of decorating each structure with oxidation states is
+        recorded in a side table, ``{table}_decorations``, with the material
+        id, a digest of the structure (see :func:`~.py_struct_digest`), the
+        method, the id of the added structure and, if decoration failed, the
+        error. If the table already exists, structures that were already
+        decorated by the same method, or failed to be, are skipped, and the
+        structures of materials that have changed are replaced.
+
         Note:
         ----
             This is very computationally expensive for large datasets
@@ -122,24 +431,34 @@ class StructureDB:
 
         Args:
         ----
-            table (str): The name of the table to add.
-            mp_data: The Materials Project data to parse. If this is None, data
-                will be downloaded. Downloading data needs `mp_api_key` to be set.
+            table (str): The name of the table to add to.
+            mp_data: An iterable of the Materials Project data to parse. If this
+                is None, data will be downloaded. Downloading data needs
+                `mp_api_key` to be set.
             mp_api_key (str): A Materials Project API key. Only needed if `mp_data`
                 is None.
+            determine_oxi (str): The method to determine oxidation states,
+                see :meth:`SmactStructure.from_py_struct`. Defaults to 'BV'.
+            num_processes (int): The number of worker processes. If None,
+                the number of CPUs is used. Defaults to None. If 1, structures
+                are decorated in the calling process.
+            chunksize (int): The number of structures sent to a worker at once.
+                Defaults to 64.
+            batch_size (int): The number of structures inserted at once,
+                see :meth:`add_structs`. Defaults to 1000.
 
         Returns:
         -------
             The number of structs added.
 
         """
-        if mp_api_key is None:
-            # Try to get the API key from the environment
-            mp_api_key = SETTINGS.get("PMG_MAPI_KEY") or os.environ.get("MP_API_KEY")
-        if mp_api_key is None:
-            raise ValueError("No Materials Project API key provided.")
-
         if mp_data is None:  # pragma: no cover
+            if mp_api_key is None:
+                # Try to get the API key from the environment
+                mp_api_key = SETTINGS.get("PMG_MAPI_KEY") or os.environ.get("MP_API_KEY")
+            if mp_api_key is None:
+                raise ValueError("No Materials Project API key provided.")
+
             if len(mp_api_key) != 32:
                 with MPRester(mp_api_key) as m:
                     data = m.query(
@@ -155,15 +474,76 @@ class StructureDB:
         else:
             data = mp_data
 
-        self.add_table(table)
+        with self as c:
+            c.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+            table_exists = c.fetchone()[0] == 1
+        if not table_exists:
+            self.add_table(table)
+
+        with self as c:
+            self._create_decorations_table(c, table)
+            c.execute(f"SELECT material_id, digest, method, structure_id FROM {table}_decorations")
+            decorated = {material_id: record for material_id, *record in c.fetchall()}
+
+        # Ids of the structures to replace, of the materials being decorated
+        stale = {}
+
+        def pending():
+            # Skip materials that are unchanged, and replace those that changed
+            for entry in data:
+                digest = py_struct_digest(entry["structure"])
+                record = decorated.get(entry["material_id"])
+                if record is not None and record[:2] == [digest, determine_oxi]:
+                    continue
+                if record is not None and record[2] is not None:
+                    stale[entry["material_id"]] = record[2]
+                yield _mprest_entry(entry["material_id"], digest, entry["structure"])
+
+        parse_iter = _imap_chunked(
+            partial(_decorate_mprest_chunk, determine_oxi=determine_oxi),
+            pending(),
+            num_processes=num_processes,
+            chunksize=chunksize,
+        )
+
+        # Decorations of the structures yielded but not yet inserted, in order
+        records = deque()
+        failures = []
+        stale_ids = []
+
+        def structs():
+            for material_id, digest, struct, error in parse_iter:
+                if material_id in stale:
+                    stale_ids.append(stale.pop(material_id))
+                if struct is None:
+                    logger.warning(f"{material_id}: {error}")
+                    failures.append((material_id, digest, determine_oxi, None, error))
+                else:
+                    records.append((material_id, digest))
+                    yield struct
+
+        def record_decorations(c, batch, ids):
+            self._delete(c, table, stale_ids)
+            stale_ids.clear()
+            rows = [(*records.popleft(), determine_oxi, i, None) for i in ids]
+            c.executemany(f"INSERT OR REPLACE INTO {table}_decorations VALUES (?, ?, ?, ?, ?)", rows + failures)
+            failures.clear()
+
+        num = self._add_structs(
+            structs(),
+            table,
+            commit_after_each=True,
+            batch_size=batch_size,
+            # Stale structures are deleted by id, so keep the indexes when replacing any
+            defer_indexes=not decorated,
+            on_insert=record_decorations,
+        )
 
-        if pathos_available:
-            pool = ParallelPool()
-            parse_iter = pool.uimap(parse_mprest, data)
-        else:  # pragma: no cover
-            parse_iter = map(parse_mprest, data)
+        with self as c:
+            self._delete(c, table, stale_ids)
+            c.executemany(f"INSERT OR REPLACE INTO {table}_decorations VALUES (?, ?, ?, ?, ?)", failures)
 
-        return self.add_structs(parse_iter, table, commit_after_each=True)
+        return num
 
     def add_table(self, table: str):
         """
@@ -177,9 +557,273 @@ class StructureDB:
         with self as c:
             c.execute(
                 f"""CREATE TABLE {table}
-                (composition TEXT NOT NULL, structure TEXT NOT NULL)""",
+                (composition TEXT NOT NULL, structure TEXT NOT NULL, id INTEGER PRIMARY KEY)""",
+            )
+            self._create_species_table(c, table)
+            self._create_species_indexes(c, table)
+
+        self._species_tables[table] = True
+        self.invalidate_cache(table)
+
+    @staticmethod
+    def _create_species_table(c: sqlite3.Cursor, table: str):
+        c.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table}_species
+            (structure_id INTEGER NOT NULL, element TEXT NOT NULL,
+            charge INTEGER NOT NULL, stoichiometry INTEGER NOT NULL)""",
+        )
+        c.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table}_prototypes
+            (structure_id INTEGER PRIMARY KEY, charges TEXT NOT NULL, prototype TEXT NOT NULL)""",
+        )
+
+    @staticmethod
+    def _create_decorations_table(c: sqlite3.Cursor, table: str):
+        c.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table}_decorations
+            (material_id TEXT PRIMARY KEY, digest TEXT NOT NULL, method TEXT NOT NULL,
+            structure_id INTEGER, error TEXT)""",
+        )
+
+    @staticmethod
+    def _create_species_indexes(c: sqlite3.Cursor, table: str):
+        c.execute(
+            f"""CREATE INDEX IF NOT EXISTS {table}_species_by_species
+            ON {table}_species (element, charge, structure_id)""",
+        )
+        c.execute(
+            f"""CREATE INDEX IF NOT EXISTS {table}_species_by_structure
+            ON {table}_species (structure_id, element, charge, stoichiometry)""",
+        )
+        c.execute(
+            f"""CREATE INDEX IF NOT EXISTS {table}_prototypes_by_prototype
+            ON {table}_prototypes (charges, prototype, structure_id)""",
+        )
+
+    def _has_species_table(self, c: sqlite3.Cursor, table: str) -> bool:
+        """Determine whether a structure table has species and prototype tables."""
+        if table not in self._species_tables:
+            c.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (?, ?)",
+                (f"{table}_species", f"{table}_prototypes"),
+            )
+            self._species_tables[table] = c.fetchone()[0] == 2
+
+        return self._species_tables[table]
+
+    def _insert(self, c: sqlite3.Cursor, structs: Sequence[SmactStructure], table: str) -> range:
+        """Insert structures and, if the table has them, their species and prototype rows, returning their ids."""
+        if not c.connection.in_transaction:
+            # Take the write lock before reading the next free id
+            c.execute("BEGIN IMMEDIATE")
+
+        c.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}")
+        (last_id,) = c.fetchone()
+        ids = range(last_id + 1, last_id + 1 + len(structs))
+        if self.cache is not None:
+            # Rowids of deleted structures can be reused
+            self.cache.invalidate(table, ids)
+
+        c.executemany(
+            f"INSERT INTO {table} (rowid, composition, structure) VALUES (?, ?, ?)",
+            [(i, struct.composition(), self._encode(struct)) for i, struct in zip(ids, structs, strict=True)],
+        )
+        if self._has_species_table(c, table):
+            c.executemany(
+                f"INSERT INTO {table}_species VALUES (?, ?, ?, ?)",
+                [
+                    (i, ele, int(charge), int(stoic))
+                    for i, struct in zip(ids, structs, strict=True)
+                    for ele, charge, stoic in struct.species
+                ],
+            )
+            c.executemany(
+                f"INSERT OR REPLACE INTO {table}_prototypes VALUES (?, ?, ?)",
+                [
+                    (i, charge_pattern(charge for _, charge, _ in struct.species), prototype_key(struct.species))
+                    for i, struct in zip(ids, structs, strict=True)
+                ],
+            )
+
+        return ids
+
+    def _delete(self, c: sqlite3.Cursor, table: str, ids: Sequence[int]):
+        """Delete structures and, if the table has them, their species and prototype rows."""
+        if not ids:
+            return
+
+        rows = [(i,) for i in ids]
+        c.executemany(f"DELETE FROM {table} WHERE rowid = ?", rows)
+        if self._has_species_table(c, table):
+            c.executemany(f"DELETE FROM {table}_species WHERE structure_id = ?", rows)
+            c.executemany(f"DELETE FROM {table}_prototypes WHERE structure_id = ?", rows)
+        if self.cache is not None:
+            self.cache.invalidate(table, ids)
+
+    def _decode_rows(self, table: str, rows: Iterable[tuple[int, str | bytes]]) -> list[SmactStructure]:
+        """Decode (rowid, structure) rows, using the cache if enabled."""
+        if self.cache is None:
+            return [_decode_structure(data) for _, data in rows]
+
+        structs = []
+        for rowid, data in rows:
+            struct = self.cache.get(table, rowid)
+            if struct is None:
+                struct = _decode_structure(data)
+                self.cache.put(table, rowid, struct)
+            structs.append(struct)
+        return structs
+
+    def invalidate_cache(self, table: str | None = None):
+        """
+        Clear cached structures.
+
+        Needed only after a table is modified other than through this
+        instance.
+
+        Args:
+        ----
+            table: The table whose structures to clear. If None, the
+                whole cache is cleared.
+
+        """
+        if self.cache is not None:
+            self.cache.invalidate(table)
+
+    def _encode(self, struct: SmactStructure, structure_format: str | None = None) -> str | bytes:
+        """Encode a structure for storage, by default in the database's format."""
+        if (structure_format or self.structure_format) == "binary":
+            return struct.as_bytes(compress=self.compress)
+        return struct.as_poscar()
+
+    def convert_structures(
+        self,
+        table: str,
+        structure_format: str = "binary",
+        batch_size: int = 1000,
+    ) -> int:
+        """
+        Re-encode the structures of a table.
+
+        Structures not already stored in `structure_format` are decoded and
+        written back in it; binary structures are compressed according to
+        :attr:`compress`. Each batch is committed once converted, so an
+        interrupted conversion can be resumed by rerunning it.
+
+        Args:
+        ----
+            table: The name of the table to convert.
+            structure_format (str): The encoding to convert to, either
+                "poscar" or "binary". Defaults to "binary".
+            batch_size (int): The number of structures converted at once.
+
+        Returns:
+        -------
+            The number of structures converted.
+
+        """
+        if structure_format not in STRUCTURE_FORMATS:
+            raise ValueError(f"Unknown structure format {structure_format!r}, expected one of {STRUCTURE_FORMATS}.")
+
+        stored_type = "text" if structure_format == "binary" else "blob"
+        num, last_id = 0, 0
+        with self as c:
+            while rows := c.execute(
+                f"""SELECT rowid, structure FROM {table}
+                WHERE rowid > ? AND typeof(structure) = ? ORDER BY rowid LIMIT ?""",
+                (last_id, stored_type, batch_size),
+            ).fetchall():
+                c.executemany(
+                    f"UPDATE {table} SET structure = ? WHERE rowid = ?",
+                    [(self._encode(_decode_structure(data), structure_format), rowid) for rowid, data in rows],
+                )
+                c.connection.commit()
+                num += len(rows)
+                last_id = rows[-1][0]
+
+        self.invalidate_cache(table)
+
+        return num
+
+    def index_species(self, table: str) -> int:
+        """
+        Add or complete the species and prototype tables of a structure table.
+
+        This migrates tables created before these tables were introduced.
+        Species are read from the stored compositions, and only structures
+        missing from each table are added, so the migration can be
+        rerun safely.
+
+        Tables created without an ``id`` column key their structures on the
+        implicit rowid, which ``VACUUM`` may renumber. Such tables are
+        rebuilt with an ``id`` column holding their current rowids, so
+        the ids of their structures are stable from then on, and their
+        species and prototype tables are rebuilt from scratch.
+
+        Args:
+        ----
+            table: The name of the structure table to index.
+
+        Returns:
+        -------
+            The number of structures added to the species table.
+
+        """
+        with self as c:
+            c.execute(f"PRAGMA table_info({table})")
+            if not any(name == "id" and pk for _, name, _, _, _, pk in c.fetchall()):
+                self._add_id_column(c, table)
+
+            self._create_species_table(c, table)
+            c.execute(
+                f"""SELECT rowid, composition FROM {table}
+                WHERE rowid NOT IN (SELECT structure_id FROM {table}_species)""",
+            )
+            rows = c.fetchall()
+            c.executemany(
+                f"INSERT INTO {table}_species VALUES (?, ?, ?, ?)",
+                (
+                    (rowid, ele, charge, stoic)
+                    for rowid, composition in rows
+                    for ele, charge, stoic in _parse_composition(composition)
+                ),
             )
 
+            c.execute(
+                f"""SELECT rowid, composition FROM {table}
+                WHERE rowid NOT IN (SELECT structure_id FROM {table}_prototypes)""",
+            )
+            prototypes = [(rowid, _parse_composition(composition)) for rowid, composition in c.fetchall()]
+            c.executemany(
+                f"INSERT OR REPLACE INTO {table}_prototypes VALUES (?, ?, ?)",
+                (
+                    (rowid, charge_pattern(charge for _, charge, _ in species), prototype_key(species))
+                    for rowid, species in prototypes
+                ),
+            )
+            self._create_species_indexes(c, table)
+
+        self._species_tables[table] = True
+        return len(rows)
+
+    def _add_id_column(self, c: sqlite3.Cursor, table: str):
+        """Rebuild a table keyed on its implicit rowid with an ``id`` column, keeping the ids."""
+        c.execute(
+            f"""CREATE TABLE {table}_migrated
+            (composition TEXT NOT NULL, structure TEXT NOT NULL, id INTEGER PRIMARY KEY)""",
+        )
+        c.execute(
+            f"""INSERT INTO {table}_migrated (id, composition, structure)
+            SELECT rowid, composition, structure FROM {table} ORDER BY rowid""",
+        )
+        c.execute(f"DROP TABLE {table}")
+        c.execute(f"ALTER TABLE {table}_migrated RENAME TO {table}")
+
+        # Rows indexed before may refer to rowids renumbered since
+        c.execute(f"DROP TABLE IF EXISTS {table}_species")
+        c.execute(f"DROP TABLE IF EXISTS {table}_prototypes")
+        self.invalidate_cache(table)
+
     def add_struct(self, struct: SmactStructure, table: str):
         """
         Add a SmactStructure to a table.
@@ -190,30 +834,86 @@ class StructureDB:
             table: The name of the table to add the structure to.
 
         """
-        entry = (struct.composition(), struct.as_poscar())
-
         with self as c:
-            c.execute(f"INSERT into {table} VALUES (?, ?)", entry)
+            self._insert(c, [struct], table)
 
     def add_structs(
         self,
-        structs: Sequence[SmactStructure],
+        structs: Iterable[SmactStructure | None],
         table: str,
         commit_after_each: bool | None = False,
+        *,
+        batch_size: int = 1000,
+        defer_indexes: bool = False,
+        progress: Callable[[int, float], None] | None = None,
     ) -> int:
         """
         Add several SmactStructures to a table.
 
+        Structures are inserted in batches, each with a single ``executemany``
+        per table, so `structs` may be a lazy iterable of any length.
+
         Args:
         ----
             structs: Iterable of :class:`~.SmactStructure` s to add to table.
+                None entries, e.g. from structures that could not be decorated
+                with oxidation states, are skipped.
             table: The name of the table to add the structs to.
             commit_after_each (bool, optional): Whether to commit the addition
-                after each structure is added.
+                after each batch of structures is added.
                 This is useful when adding a large number of structures over
                 a long timeframe, as it ensures some structures are added,
                 even if the program terminates before completion.
                 Defaults to False.
+            batch_size (int): The number of structures inserted at once.
+                Defaults to 1000.
+            defer_indexes (bool): Whether to drop the indexes of the species
+                and prototype tables while adding the structures, and rebuild them afterwards.
+                This is faster when adding many structures to a large table.
+                Defaults to False.
+            progress: A function called after each batch with the number of
+                structures added so far and the throughput, in structures per
+                second.
+
+        Returns:
+        -------
+            The number of structures added.
+
+        """
+        return self._add_structs(
+            structs,
+            table,
+            commit_after_each,
+            batch_size=batch_size,
+            defer_indexes=defer_indexes,
+            progress=progress,
+        )
+
+    def _add_structs(
+        self,
+        structs: Iterable[SmactStructure | None],
+        table: str,
+        commit_after_each: bool | None = False,
+        *,
+        batch_size: int = 1000,
+        defer_indexes: bool = False,
+        progress: Callable[[int, float], None] | None = None,
+        on_insert: Callable[[sqlite3.Cursor, tuple[SmactStructure, ...], range], None] | None = None,
+    ) -> int:
+        """
+        Add several SmactStructures to a table, see :meth:`add_structs`.
+
+        Args:
+        ----
+            structs: See :meth:`add_structs`.
+            table: See :meth:`add_structs`.
+            commit_after_each: See :meth:`add_structs`.
+            batch_size: See :meth:`add_structs`.
+            defer_indexes: See :meth:`add_structs`.
+            progress: See :meth:`add_structs`.
+            on_insert: A function called with the cursor, each batch of
+                structures and their ids, after the batch is inserted and
+                before it is committed.
 
         Returns:
         -------
@@ -221,17 +921,36 @@ class StructureDB:
 
         """
         with self as c:
-            num = 0
-            for struct in structs:
-                if struct is None:
-                    # Handling for poorly decorated structures
-                    continue
-                entry = (struct.composition(), struct.as_poscar())
-                c.execute(f"INSERT into {table} VALUES (?, ?)", entry)
-                num += 1
+            if defer_indexes and self._has_species_table(c, table):
+                c.execute(f"DROP INDEX IF EXISTS {table}_species_by_species")
+                c.execute(f"DROP INDEX IF EXISTS {table}_species_by_structure")
+                c.execute(f"DROP INDEX IF EXISTS {table}_prototypes_by_prototype")
+                c.connection.commit()
+            else:
+                defer_indexes = False
 
-                if commit_after_each:
-                    self.conn.commit()
+            num = 0
+            start = time.perf_counter()
+            try:
+                for batch in _batched((struct for struct in structs if struct is not None), batch_size):
+                    ids = self._insert(c, batch, table)
+                    if on_insert is not None:
+                        on_insert(c, batch, ids)
+                    num += len(batch)
+
+                    if commit_after_each:
+                        c.connection.commit()
+                    if progress is not None:
+                        progress(num, num / max(time.perf_counter() - start, 1e-9))
+            except BaseException:
+                c.connection.rollback()
+                raise
+            finally:
+                if defer_indexes:
+                    # The indexes were dropped in their own transaction,
+                    # so are rebuilt even if adding the structures failed
+                    self._create_species_indexes(c, table)
+                    c.connection.commit()
 
         return num
 
@@ -252,11 +971,11 @@ class StructureDB:
         """
         with self as c:
             c.execute(
-                f"SELECT structure FROM {table} WHERE composition = ?",
+                f"SELECT rowid, structure FROM {table} WHERE composition = ?",
                 (composition,),
             )
             structs = c.fetchall()
-        return [SmactStructure.from_poscar(pos[0]) for pos in structs]
+        return self._decode_rows(table, structs)
 
     def get_with_species(
         self,
@@ -266,6 +985,10 @@ class StructureDB:
         """
         Get SmactStructures containing given species.
 
+        If the table has a species table (see :meth:`index_species`), matching
+        structures are found from its index; otherwise, the compositions of
+        the whole table are scanned.
+
         Args:
         ----
             species: A list of species as tuples, in (element, charge) format.
@@ -273,34 +996,195 @@ class StructureDB:
 
         Returns:
         -------
-            A list of :class:`SmactStructure` s in the table that contain the species.
+            A list of :class:`SmactStructure` s in the table that contain the species,
+            in insertion order.
+
+        """
+        return self.get_with_species_many([species], table)[0]
+
+    def get_with_species_many(
+        self,
+        species_lists: Sequence[list[tuple[str, int]]],
+        table: str,
+        *,
+        return_ids: bool = False,
+    ) -> list[list[SmactStructure]] | list[list[tuple[int, SmactStructure]]]:
+        """
+        Get SmactStructures containing each of several sets of species.
+
+        This is equivalent to calling :meth:`get_with_species` for each set
+        of species, but uses a single query, and structures matching several
+        sets are only decoded once; the same object is returned for each.
+
+        Args:
+        ----
+            species_lists: Lists of species as tuples, in (element, charge) format.
+            table: The name of the table from which to get the species.
+            return_ids (bool): Whether to return the rowid of each structure
+                with it, as (rowid, structure). Defaults to False.
+
+        Returns:
+        -------
+            For each list of species, a list of :class:`SmactStructure` s in the
+            table that contain the species, in insertion order.
 
         """
-        glob = "*".join("{}_*_{}{}" for _ in range(len(species)))
-        glob = f"*{glob}*"
+        for species in species_lists:
+            species.sort(key=itemgetter(1), reverse=True)
+            species.sort(key=itemgetter(0))
 
-        species.sort(key=itemgetter(1), reverse=True)
-        species.sort(key=itemgetter(0))
+        with self as c:
+            if self._has_species_table(c, table):
+                # Intersect the structures containing each species, for each list
+                subqueries, params = [], []
+                for i, species in enumerate(species_lists):
+                    specs = list(dict.fromkeys((ele, int(charge)) for ele, charge in species))
+                    if specs:
+                        matches = " INTERSECT ".join(
+                            f"SELECT structure_id FROM {table}_species WHERE element = ? AND charge = ?" for _ in specs
+                        )
+                    else:
+                        matches = f"SELECT rowid AS structure_id FROM {table}"
+                    subqueries.append(f"SELECT {i} AS query, structure_id FROM ({matches})")
+                    params.extend(itertools.chain.from_iterable(specs))
+
+                if subqueries:
+                    c.execute(
+                        f"""SELECT m.query, t.rowid, t.structure
+                        FROM ({" UNION ALL ".join(subqueries)}) AS m
+                        JOIN {table} AS t ON t.rowid = m.structure_id
+                        ORDER BY m.query, t.rowid""",
+                        params,
+                    )
+                    rows = c.fetchall()
+                else:
+                    rows = []
+
+            else:
+                # Scan the table once, then match each composition to each pattern
+                globs = [_species_glob(species) for species in species_lists]
+                c.execute(
+                    f"SELECT rowid, structure, composition FROM {table} WHERE "
+                    + (" OR ".join("composition GLOB ?" for _ in globs) or "0"),
+                    globs,
+                )
+                rows = sorted(
+                    (i, rowid, structure)
+                    for rowid, structure, composition in c.fetchall()
+                    for i, glob in enumerate(globs)
+                    if fnmatchcase(composition, glob)
+                )
+
+        decoded = {}
+        results = [[] for _ in species_lists]
+        for i, rowid, structure in rows:
+            if rowid not in decoded:
+                (decoded[rowid],) = self._decode_rows(table, [(rowid, structure)])
+            results[i].append((rowid, decoded[rowid]) if return_ids else decoded[rowid])
+
+        return results
+
+    def get_with_prototype(
+        self,
+        charges: Sequence[int],
+        table: str,
+        *,
+        stoichiometry: Sequence[int] | None = None,
+        return_ids: bool = False,
+    ) -> list[SmactStructure] | list[tuple[int, SmactStructure]]:
+        """
+        Get SmactStructures with a given anonymised charge pattern.
+
+        These are the structures that can be converted into a compound with
+        the same charges by substituting each species with one of the same
+        charge. If the table has a prototype table (see :meth:`index_species`),
+        they are found with a single index lookup.
+
+        Args:
+        ----
+            charges: The oxidation state of each species, in any order.
+            table: The name of the table from which to get the structures.
+            stoichiometry: The stoichiometry of the species with each charge.
+                If given, only structures with the same reduced stoichiometry
+                are returned, see :func:`~.prototype_key`.
+            return_ids (bool): Whether to return the rowid of each structure
+                with it, as (rowid, structure). Defaults to False.
 
-        # Generate a list of [element1, charge1, sign1, element2, ...]
-        vals = list(itertools.chain.from_iterable([x[0], abs(x[1]), get_sign(x[1])] for x in species))
+        Returns:
+        -------
+            A list of :class:`SmactStructure` s in the table with the charge
+            pattern, in insertion order.
 
-        glob_form = glob.format(*vals)
+        """
+        pattern = charge_pattern(charges)
+        prototype = None
+        if stoichiometry is not None:
+            prototype = prototype_key(("", charge, stoic) for charge, stoic in zip(charges, stoichiometry, strict=True))
 
         with self as c:
-            c.execute(
-                f"SELECT structure FROM {table} WHERE composition GLOB ?",
-                (glob_form,),
-            )
-            structs = c.fetchall()
+            if self._has_species_table(c, table):
+                query = f"""SELECT t.rowid, t.structure FROM {table}_prototypes AS p
+                JOIN {table} AS t ON t.rowid = p.structure_id WHERE p.charges = ?"""
+                params = [pattern]
+                if prototype is not None:
+                    query += " AND p.prototype = ?"
+                    params.append(prototype)
+                c.execute(f"{query} ORDER BY t.rowid", params)
+                rows = c.fetchall()
+
+            else:
+                c.execute(f"SELECT rowid, structure, composition FROM {table} ORDER BY rowid")
+                rows = []
+                for rowid, structure, composition in c:
+                    species = _parse_composition(composition)
+                    if charge_pattern(charge for _, charge, _ in species) == pattern and (
+                        prototype is None or prototype_key(species) == prototype
+                    ):
+                        rows.append((rowid, structure))
+
+        structs = self._decode_rows(table, rows)
+        if return_ids:
+            return [(rowid, struct) for (rowid, _), struct in zip(rows, structs, strict=True)]
+        return structs
+
+
+def _parse_composition(composition: str) -> list[tuple[str, int, int]]:
+    """Get the (element, charge, stoichiometry) species of a composition key."""
+    return [
+        (ele, int(charge) * (-1 if sign == "-" else 1), int(stoic))
+        for ele, stoic, charge, sign in _COMPOSITION_RE.findall(composition)
+    ]
+
 
-        return [SmactStructure.from_poscar(pos[0]) for pos in structs]
+def _species_glob(species: list[tuple[str, int]]) -> str:
+    """Get a GLOB pattern matching compositions that contain sorted species."""
+    glob = "*".join("{}_*_{}{}" for _ in range(len(species)))
+    glob = f"*{glob}*"
+
+    # Generate a list of [element1, charge1, sign1, element2, ...]
+    vals = list(itertools.chain.from_iterable([x[0], abs(x[1]), get_sign(x[1])] for x in species))
+
+    return glob.format(*vals)
+
+
+def _decode_structure(data: str | bytes) -> SmactStructure:
+    """Decode a stored structure, in either format."""
+    if isinstance(data, bytes):
+        return SmactStructure.from_bytes(data)
+    return SmactStructure.from_poscar(data)
+
+
+def _batched(iterable: Iterable, n: int):
+    """Split an iterable into tuples of length `n`, like :func:`itertools.batched` in Python 3.12."""
+    it = iter(iterable)
+    while batch := tuple(itertools.islice(it, n)):
+        yield batch
 
 
 def parse_mprest(
     data: dict[str, pymatgen.core.Structure | str],
     determine_oxi: str = "BV",
-) -> SmactStructure:
+) -> SmactStructure | None:
     """
     Parse MPRester query data to generate structures.
 
@@ -314,11 +1198,107 @@ def parse_mprest(
 
     Returns:
     -------
-        An oxidation-state-decorated :class:`SmactStructure`.
+        An oxidation-state-decorated :class:`SmactStructure`, or None if
+        the oxidation states could not be determined.
 
     """
-    try:
-        return SmactStructure.from_py_struct(data["structure"], determine_oxi="BV")
-    except:
+    ((_, _, struct, error),) = _decorate_mprest_chunk(
+        [_mprest_entry(data["material_id"], None, data["structure"])], determine_oxi
+    )
+    if struct is None:
         # Couldn't decorate with oxidation states
-        logger.warn(f"Couldn't decorate {data['material_id']} with oxidation states.")
+        logger.warning(f"Couldn't decorate {data['material_id']} with oxidation states: {error}")
+    return struct
+
+
+def _mprest_entry(
+    material_id: str,
+    digest: str | None,
+    structure: pymatgen.core.Structure,
+) -> tuple[str, str | None, np.ndarray, list[pymatgen.core.Composition], np.ndarray]:
+    """Get only what is needed to rebuild a structure, to send to a worker process."""
+    return material_id, digest, structure.lattice.matrix, [site.species for site in structure], structure.frac_coords
+
+
+def _decorate_mprest_chunk(
+    entries: Sequence[tuple[str, str, np.ndarray, list[pymatgen.core.Composition], np.ndarray]],
+    determine_oxi: str,
+) -> list[tuple[str, str, SmactStructure | None, str | None]]:
+    """
+    Decorate a chunk of MPRester query data, keeping the outcome for each structure.
+
+    Args:
+    ----
+        entries: Tuples of the material id, the digest of the structure, and
+            its lattice matrix, site species and fractional coordinates.
+        determine_oxi (str): See :func:`parse_mprest`.
+
+    Returns:
+    -------
+        Tuples of the material id, the digest, the decorated
+            :class:`SmactStructure` or None, and the error message or None.
+
+    """
+    records = []
+    for material_id, digest, lattice, species, frac_coords in entries:
+        try:
+            structure = pmg_Structure(lattice, species, frac_coords)
+            records.append((material_id, digest, SmactStructure.from_py_struct(structure, determine_oxi), None))
+        except DecorationError as e:
+            records.append((material_id, digest, None, str(e)))
+        except Exception as e:
+            # Record any other failure rather than aborting the whole ingestion
+            records.append((material_id, digest, None, f"{type(e).__name__}: {e}"))
+
+    return records
+
+
+def _imap_chunked(
+    func: Callable[[list], list],
+    iterable: Iterable,
+    *,
+    num_processes: int | None = None,
+    chunksize: int = 64,
+    max_pending: int | None = None,
+) -> Iterator:
+    """
+    Apply a function to chunks of an iterable on a process pool, streaming the results.
+
+    Unlike :meth:`multiprocessing.pool.Pool.imap`, the iterable is consumed
+    lazily: at most `max_pending` chunks are submitted ahead of the
+    results being consumed.
+
+    Args:
+    ----
+        func: A picklable function taking a list of items and returning a
+            list of results.
+        iterable: The items.
+        num_processes (int): The number of worker processes. If None, the
+            number of CPUs is used. If there is only one, `func` is applied
+            in the calling process.
+        chunksize (int): The number of items in each chunk.
+        max_pending (int): The maximum number of chunks in flight. Defaults
+            to twice the number of processes.
+
+    Yields:
+    ------
+        The results, in the order of the items.
+
+    """
+    chunks = (list(chunk) for chunk in _batched(iterable, chunksize))
+    num_processes = multiprocessing.cpu_count() if num_processes is None else num_processes
+    if num_processes == 1:
+        for chunk in chunks:
+            yield from func(chunk)
+        return
+
+    max_pending = 2 * num_processes if max_pending is None else max_pending
+    with multiprocessing.Pool(processes=num_processes) as pool:
+        pending = deque()
+        for chunk in chunks:
+            if len(pending) >= max_pending:
+                yield from pending.popleft().get()
+            pending.append(pool.apply_async(func, (chunk,)))
+
+        while pending:
+            yield from pending.popleft().get()
@@ -5,7 +5,9 @@ from __future__ import annotations
 import itertools
 import json
 import os
-from copy import deepcopy
+import struct
+import zipfile
+from functools import cached_property
 from operator import itemgetter
 from typing import TYPE_CHECKING
 
@@ -13,13 +15,136 @@ import numpy as np
 import pandas as pd
 import pymatgen.analysis.structure_prediction as pymatgen_sp
 
-from .utilities import parse_spec
+from .structure import MutatedStructure
+from .utilities import get_sign, parse_spec
 
 if TYPE_CHECKING:
-    from collections.abc import Callable, Generator
+    from collections.abc import Callable, Generator, Sequence
 
     from .structure import SmactStructure
 
+# Version of the binary lambda table format written by CationMutator.save
+LAMBDA_FORMAT_VERSION = 1
+
+# Lambda value of species pairs missing from a lambda table, by default
+DEFAULT_ALPHA = -5.0
+
+
+class _ConstantAlpha:
+    """A picklable alpha function that returns the same lambda value for any species pair."""
+
+    def __init__(self, value: float):
+        self.value = float(value)
+
+    def __call__(self, s1: str, s2: str) -> float:
+        return self.value
+
+    def __eq__(self, other):
+        return isinstance(other, _ConstantAlpha) and self.value == other.value
+
+    def __hash__(self):
+        return hash((_ConstantAlpha, self.value))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.value})"
+
+
+def _make_alpha(alpha: Callable[[str, str], float] | float) -> Callable[[str, str], float]:
+    """Get the alpha function for a function or constant lambda value."""
+    if callable(alpha):
+        return alpha
+    try:
+        return _ConstantAlpha(alpha)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"alpha must be a function or a number, not {alpha!r}.") from e
+
+
+def _memmap_npz_member(path: str, name: str) -> np.ndarray:
+    """
+    Memory-map an array stored in an uncompressed ``.npz`` archive.
+
+    Falls back to reading the array into memory if the member
+    is compressed.
+
+    Args:
+    ----
+        path (str): The ``.npz`` archive.
+        name (str): The name of the array within the archive.
+
+    Returns:
+    -------
+        The array, as a read-only :class:`numpy.memmap` where possible.
+
+    """
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(f"{name}.npy")
+
+    if info.compress_type != zipfile.ZIP_STORED:
+        with np.load(path) as data:
+            return data[name]
+
+    with open(path, "rb") as f:
+        # Skip the zip local file header, whose extra field may differ
+        # from the one in the central directory
+        f.seek(info.header_offset)
+        fname_len, extra_len = struct.unpack("<HH", f.read(30)[26:30])
+        f.seek(info.header_offset + 30 + fname_len + extra_len)
+
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape, order="F" if fortran_order else "C")
+
+
+def _relabel_structure(
+    structure: SmactStructure,
+    init_species: Sequence[str],
+    final_species: Sequence[str],
+) -> MutatedStructure:
+    """
+    Replace species of a structure, without copying its sites.
+
+    Args:
+    ----
+        structure (SmactStructure): The structure to mutate.
+        init_species: The species within the structure to mutate.
+        final_species: The species to replace each initial species with.
+
+    Returns:
+    -------
+        A :class:`~.MutatedStructure` view of `structure`.
+
+    Raises:
+    ------
+        ValueError: An initial species is not in the structure, or the
+            mutated structure is not charge neutral.
+
+    """
+    struct_spec_tups = list(map(itemgetter(0, 1), structure.species))
+    struct_spec_strs = structure.get_spec_strs()
+
+    species = list(structure.species)
+    relabel = {}
+    for init_spec, final_spec in zip(init_species, final_species, strict=True):
+        spec_loc = struct_spec_tups.index(parse_spec(init_spec))
+        ele, charge = parse_spec(final_spec)
+        species[spec_loc] = (ele, charge, species[spec_loc][2])
+        relabel[f"{ele}{abs(charge) or ''}{get_sign(charge)}"] = struct_spec_strs[spec_loc]
+
+    # Check for charge neutrality
+    if sum(x[1] * x[2] for x in species) != 0:
+        raise ValueError("New structure is not charge neutral.")
+
+    # Sort species again
+    species.sort(key=itemgetter(1), reverse=True)
+    species.sort(key=itemgetter(0))
+
+    return MutatedStructure(structure, species, relabel)
+
 
 class CationMutator:
     """
@@ -31,12 +156,21 @@ class CationMutator:
         Inorganic Chemistry, 50(2), 656-663.
         `doi:10.1021/ic102031h <https://pubs.acs.org/doi/10.1021/ic102031h>`_
 
+    Note:
+    ----
+        Dense copies of the lambda table and the normalisation constants
+        derived from it are computed on first use and cached. They are
+        invalidated whenever :attr:`lambda_tab` is reassigned; after
+        modifying the table in place, reassign it to refresh them.
+
     """
 
+    _DERIVED = ("spec_idx", "spec_charges", "lambda_mat", "exp_lambda_mat", "row_sums", "col_sums", "Z")
+
     def __init__(
         self,
         lambda_df: pd.DataFrame,
-        alpha: Callable[[str, str], float] | None = (lambda s1, s2: -5.0),
+        alpha: Callable[[str, str], float] | float | None = -5.0,
     ):
         """
         Assign attributes and get lambda table.
@@ -48,26 +182,99 @@ class CationMutator:
             alpha: A function to call to fill in missing lambda values.
                 The function must take the two species' strings as
                 arguments, and return a floating point lambda
-                value.
-                Defaults to a function that unconditionally returns
-                -5.0.
+                value. Alternatively, a single lambda value to use
+                for every missing pair, which allows the table to be
+                filled without calling a function for each pair.
+                Defaults to -5.0, which is also used if alpha is None.
+
+        Raises:
+        ------
+            ValueError: alpha is neither a function nor a number.
 
         """
         self.lambda_tab = lambda_df
 
         self.specs = set(itertools.chain.from_iterable(set(getattr(self.lambda_tab, x)) for x in ["columns", "index"]))
 
-        self.alpha = alpha
+        self.alpha = _make_alpha(DEFAULT_ALPHA if alpha is None else alpha)
 
         # Make sure table is fully populated
         self._populate_lambda()
 
-        self.Z = np.exp(self.lambda_tab.to_numpy()).sum()
+    @property
+    def lambda_tab(self) -> pd.DataFrame:
+        """The lambda table, as a DataFrame labelled by species strings."""
+        return self._lambda_tab
+
+    @lambda_tab.setter
+    def lambda_tab(self, lambda_df: pd.DataFrame):
+        self._lambda_tab = lambda_df
+
+        # Invalidate anything derived from the old table
+        for attr in self._DERIVED:
+            self.__dict__.pop(attr, None)
+
+    @cached_property
+    def spec_idx(self) -> dict[str, int]:
+        """Mapping of species strings to row/column indices of :attr:`lambda_mat`."""
+        return {spec: i for i, spec in enumerate(self.lambda_tab.index)}
+
+    @cached_property
+    def spec_charges(self) -> np.ndarray:
+        """Oxidation states of the species in the lambda table, in :attr:`lambda_mat` order."""
+        return np.array([parse_spec(spec)[1] for spec in self.lambda_tab.index], dtype=int)
+
+    @cached_property
+    def lambda_mat(self) -> np.ndarray:
+        """The lambda table as a contiguous float64 matrix."""
+        return self.lambda_tab.to_numpy(dtype=np.float64, copy=True)
+
+    @cached_property
+    def exp_lambda_mat(self) -> np.ndarray:
+        """The exponentiated lambda table."""
+        return np.exp(self.lambda_mat)
+
+    @cached_property
+    def row_sums(self) -> np.ndarray:
+        """Row sums of :attr:`exp_lambda_mat`."""
+        return self.exp_lambda_mat.sum(axis=1)
+
+    @cached_property
+    def col_sums(self) -> np.ndarray:
+        """Column sums of :attr:`exp_lambda_mat`."""
+        return self.exp_lambda_mat.sum(axis=0)
+
+    @cached_property
+    def Z(self) -> float:
+        """The partition function, i.e. the sum of the exponentiated lambda table."""
+        return self.exp_lambda_mat.sum()
+
+    def species_indices(self, species: Sequence[str]) -> np.ndarray:
+        """
+        Get the lambda matrix indices of a sequence of species.
+
+        Args:
+        ----
+            species: A sequence of species strings.
+
+        Returns:
+        -------
+            An integer array of indices into :attr:`lambda_mat`.
+
+        Raises:
+        ------
+            ValueError: A species is not in the lambda table.
+
+        """
+        try:
+            return np.fromiter((self.spec_idx[spec] for spec in species), dtype=np.intp, count=len(species))
+        except KeyError as e:
+            raise ValueError(f"{e.args[0]} not in lambda table.")
 
     @staticmethod
     def from_json(
         lambda_json: str | None = None,
-        alpha: Callable[[str, str], float] | None = (lambda s1, s2: -5.0),
+        alpha: Callable[[str, str], float] | float | None = -5.0,
     ):
         """
         Create a CationMutator instance from a DataFrame.
@@ -109,6 +316,85 @@ class CationMutator:
 
         return CationMutator(lambda_df, alpha)
 
+    def save(self, path: str):
+        """
+        Save the populated lambda table in a compact binary format.
+
+        The table is written as an uncompressed NumPy ``.npz`` archive
+        containing the dense lambda matrix, the species labels, the alpha
+        value and a format version, and can be read back with :meth:`load`.
+
+        Args:
+        ----
+            path (str): The file to write. NumPy appends ``.npz`` if
+                the path does not already end with it.
+
+        Raises:
+        ------
+            TypeError: The alpha of this instance is a function rather
+                than a constant, so it cannot be saved.
+
+        """
+        if not isinstance(self.alpha, _ConstantAlpha):
+            raise TypeError("Only a constant alpha can be saved; create the CationMutator with a numeric alpha.")
+
+        np.savez(
+            path,
+            lambda_mat=self.lambda_mat,
+            species=np.array(self.lambda_tab.index, dtype=str),
+            alpha=np.float64(self.alpha.value),
+            format_version=np.int64(LAMBDA_FORMAT_VERSION),
+        )
+
+    @staticmethod
+    def load(
+        path: str,
+        mmap: bool = True,
+        alpha: Callable[[str, str], float] | float | None = None,
+    ):
+        """
+        Create a CationMutator instance from a table written by :meth:`save`.
+
+        The table is already populated and symmetric, so no table
+        completion is performed.
+
+        Args:
+        ----
+            path (str): The ``.npz`` file to read.
+            mmap (bool): Whether to memory-map the lambda matrix rather than
+                reading it into memory. The mapped matrix is read-only.
+                Defaults to True.
+            alpha: Optionally override the saved alpha.
+                See :meth:`__init__`.
+
+        Returns:
+        -------
+            A :class:`CationMutator` instance.
+
+        """
+        with np.load(path) as data:
+            version = int(data["format_version"])
+            if version > LAMBDA_FORMAT_VERSION:
+                raise ValueError(f"Unsupported lambda table format version {version} in {path}.")
+
+            species = data["species"].tolist()
+            saved_alpha = float(data["alpha"])
+            lambda_mat = None if mmap else data["lambda_mat"]
+
+        if lambda_mat is None:
+            lambda_mat = _memmap_npz_member(path, "lambda_mat")
+
+        cm = CationMutator.__new__(CationMutator)
+        cm.lambda_tab = pd.DataFrame(lambda_mat, index=species, columns=species, copy=False)
+        cm.specs = set(species)
+        alpha = saved_alpha if alpha is None else alpha
+        cm.alpha = _make_alpha(alpha)
+
+        # Share the (possibly memory-mapped) matrix rather than copying it
+        cm.__dict__["lambda_mat"] = lambda_mat
+
+        return cm
+
     def _populate_lambda(self):
         """
         Populate lambda table.
@@ -116,45 +402,40 @@ class CationMutator:
         Ensures no values are NaN and performs alpha calculations,
         such that an entry exists for every possible species
         combination in the lambda table.
-        Also ensures lambda table symmetry.
+        Also ensures lambda table symmetry: a missing entry is
+        mirrored from its transpose where possible, and where
+        both entries of a pair are present the one above the
+        diagonal is kept.
 
         """
-        pairs = itertools.combinations_with_replacement(self.specs, 2)
-
-        def add_alpha(s1, s2):
-            """Add an alpha value to the lambda table at both coordinates."""
-            a = self.alpha(s1, s2)
-            self.lambda_tab.loc[s1, s2] = a
-            self.lambda_tab.loc[s2, s1] = a
-
-        def mirror_lambda(s1, s2):
-            """Mirror the lambda value at (s2, s1) into (s1, s2)."""
-            self.lambda_tab.loc[s1, s2] = self.lambda_tab.loc[s2, s1]
-
-        for s1, s2 in pairs:
-            try:
-                if np.isnan(self.lambda_tab.loc[s1, s2]):
-                    try:
-                        if not np.isnan(self.lambda_tab.loc[s2, s1]):
-                            mirror_lambda(s1, s2)
-                        else:
-                            add_alpha(s1, s2)
-                    except KeyError:
-                        add_alpha(s1, s2)
-                else:
-                    mirror_lambda(s2, s1)
-            except KeyError:
-                try:
-                    if np.isnan(self.lambda_tab.loc[s2, s1]):
-                        add_alpha(s1, s2)
-                    else:
-                        mirror_lambda(s1, s2)
-                except KeyError:
-                    add_alpha(s1, s2)
-
-        # Ensure symmetry
-        idx = self.lambda_tab.index
-        self.lambda_tab = self.lambda_tab[idx]
+        index = self.lambda_tab.index
+        columns = self.lambda_tab.columns
+
+        # Union of labels, keeping the existing row order
+        labels = pd.Index([*index, *columns.difference(index, sort=False)], name=index.name)
+
+        lambda_mat = self.lambda_tab.reindex(index=labels, columns=labels).to_numpy(dtype=np.float64, copy=True)
+
+        # Mirror values from the transpose into missing entries,
+        # then make the table symmetric from the upper triangle
+        lambda_mat = np.where(np.isnan(lambda_mat), lambda_mat.T, lambda_mat)
+        upper = np.triu(lambda_mat)
+        lambda_mat = upper + np.triu(upper, k=1).T
+
+        missing = np.isnan(lambda_mat)
+        if missing.any():
+            if isinstance(self.alpha, _ConstantAlpha):
+                lambda_mat[missing] = self.alpha.value
+            else:
+                # Fall back to calling alpha for each missing pair
+                for i, j in zip(*np.nonzero(np.triu(missing)), strict=True):
+                    lambda_mat[i, j] = lambda_mat[j, i] = self.alpha(labels[i], labels[j])
+
+        self.lambda_tab = pd.DataFrame(
+            lambda_mat,
+            index=labels,
+            columns=labels.rename(columns.name),
+        )
 
     def get_lambda(self, s1: str, s2: str) -> float:
         """
@@ -172,11 +453,20 @@ class CationMutator:
                 for the two species.
 
         """
-        if {s1, s2} <= self.specs:
-            return self.lambda_tab.loc[s1, s2]
+        i = self.spec_idx.get(s1)
+        j = self.spec_idx.get(s2)
+        if i is not None and j is not None:
+            return self.lambda_mat[i, j]
 
         return self.alpha(s1, s2)
 
+    def _get_index(self, species: str) -> int:
+        """Get the lambda matrix index of a species, raising ValueError if it is not in the table."""
+        try:
+            return self.spec_idx[species]
+        except KeyError:
+            raise ValueError(f"{species} not in lambda table.")
+
     def get_lambdas(self, species: str) -> pd.Series:
         """
         Get all the lambda values associated with a species.
@@ -201,7 +491,7 @@ class CationMutator:
         structure: SmactStructure,
         init_species: str,
         final_species: str,
-    ) -> SmactStructure:
+    ) -> MutatedStructure:
         """
         Mutate a species within a SmactStructure.
 
@@ -215,8 +505,10 @@ class CationMutator:
 
         Note:
         ----
-            Creates a deepcopy of the supplied structure,
-            such that the original instance is not modified.
+            The original instance is not modified. The mutated structure
+            is a :class:`~.MutatedStructure` view, which shares the lattice
+            and site coordinates of the original instance; use
+            :meth:`~.MutatedStructure.materialize` for an independent copy.
 
         Args:
         ----
@@ -228,45 +520,18 @@ class CationMutator:
 
         Returns:
         -------
-            A :class:`.~SmactStructure`, with the species
+            A :class:`.~MutatedStructure`, with the species
                 mutated.
 
         """
-        struct_buff = deepcopy(structure)
-        init_spec_tup = parse_spec(init_species)
-        struct_spec_tups = list(map(itemgetter(0, 1), struct_buff.species))
-        spec_loc = struct_spec_tups.index(init_spec_tup)
-
-        final_spec_tup = parse_spec(final_species)
-
-        # Replace species tuple
-        struct_buff.species[spec_loc] = (
-            *final_spec_tup,
-            struct_buff.species[spec_loc][2],
-        )
-
-        # Check for charge neutrality
-        if sum(x[1] * x[2] for x in struct_buff.species) != 0:
-            raise ValueError("New structure is not charge neutral.")
-
-        # Sort species again
-        struct_buff.species.sort(key=itemgetter(1), reverse=True)
-        struct_buff.species.sort(key=itemgetter(0))
-
-        # Replace sites
-        struct_buff.sites[final_species] = struct_buff.sites.pop(init_species)
-        # And sort
-        species_strs = struct_buff._format_style("{ele}{charge}{sign}").split(" ")
-        struct_buff.sites = {spec: struct_buff.sites[spec] for spec in species_strs}
-
-        return struct_buff
+        return _relabel_structure(structure, [init_species], [final_species])
 
     @staticmethod
     def _nary_mutate_structure(
         structure: SmactStructure,
         init_species: list,
         final_species: list,
-    ) -> SmactStructure:
+    ) -> MutatedStructure:
         """
         Perform a n-ary mutation of a SmactStructure (n>1).
         Replaces all instances of a group of species within the structure.
@@ -279,45 +544,42 @@ class CationMutator:
             init_species (list): A list of species within the structure to mutate.
             final_species (list): The list of species to replace the initial species with
 
-        """
-        # Determine the number of species to mutate
-        n = len(init_species)
-
-        struct_buff = deepcopy(structure)
-        init_spec_tup_list = [parse_spec(i) for i in init_species]
-        struct_spec_tups = list(map(itemgetter(0, 1), struct_buff.species))
-        spec_loc = [struct_spec_tups.index(init_spec_tup_list[i]) for i in range(n)]
+        Returns:
+        -------
+            A :class:`.~MutatedStructure` view, with the species mutated.
 
-        final_spec_tup_list = [parse_spec(i) for i in final_species]
+        """
+        return _relabel_structure(structure, init_species, final_species)
 
-        # Replace species tuple
-        for i in range(n):
-            struct_buff.species[spec_loc[i]] = (
-                *final_spec_tup_list[i],
-                struct_buff.species[spec_loc[i]][2],
-            )
+    def sub_prob(self, s1: str, s2: str) -> float:
+        """Calculate the probability of substitution of two species."""
+        i = self.spec_idx.get(s1)
+        j = self.spec_idx.get(s2)
+        if i is not None and j is not None:
+            return self.exp_lambda_mat[i, j] / self.Z
 
-        # Check for charge neutrality
-        if sum(x[1] * x[2] for x in struct_buff.species) != 0:
-            raise ValueError("New structure is not charge neutral")
+        return np.exp(self.alpha(s1, s2)) / self.Z
 
-        # Sort species again
-        struct_buff.species.sort(key=itemgetter(1), reverse=True)
-        struct_buff.species.sort(key=itemgetter(0))
+    def sub_probs_matrix(self, rows: Sequence[str], cols: Sequence[str]) -> np.ndarray:
+        """
+        Calculate the substitution probabilities of every pair from two lists of species.
 
-        # Replace sites
-        for i in range(n):
-            struct_buff.sites[final_species[i]] = struct_buff.sites.pop(init_species[i])
+        Args:
+        ----
+            rows: The species indexing the rows of the returned matrix.
+            cols: The species indexing the columns of the returned matrix.
 
-        # And sort
-        species_strs = struct_buff._format_style("{ele}{charge}{sign}").split(" ")
-        struct_buff.sites = {spec: struct_buff.sites[spec] for spec in species_strs}
+        Returns:
+        -------
+            A (len(rows), len(cols)) array, such that element (i, j) is
+            ``sub_prob(rows[i], cols[j])``.
 
-        return struct_buff
+        Raises:
+        ------
+            ValueError: A species is not in the lambda table.
 
-    def sub_prob(self, s1: str, s2: str) -> float:
-        """Calculate the probability of substitution of two species."""
-        return np.exp(self.get_lambda(s1, s2)) / self.Z
+        """
+        return self.exp_lambda_mat[np.ix_(self.species_indices(rows), self.species_indices(cols))] / self.Z
 
     def sub_probs(self, s1: str) -> pd.Series:
         """
@@ -327,10 +589,8 @@ class CationMutator:
         species in the lambda table.
 
         """
-        probs = self.get_lambdas(s1)
-        probs = np.exp(probs)
-        probs /= self.Z
-        return probs
+        i = self._get_index(s1)
+        return pd.Series(self.exp_lambda_mat[i] / self.Z, index=self.lambda_tab.columns, name=s1)
 
     def complete_sub_probs(self) -> pd.DataFrame:
         """Generate a DataFrame with all the substitution probabilities."""
@@ -370,18 +630,21 @@ class CationMutator:
 
     def same_spec_cond_probs(self) -> pd.Series:
         """Calculate the same species conditional substitution probabilities."""
-        return np.exp(self.lambda_tab.to_numpy().diagonal()) / np.exp(self.lambda_tab).sum(axis=0)
+        return pd.Series(self.exp_lambda_mat.diagonal() / self.col_sums, index=self.lambda_tab.columns)
 
     def pair_corr(self, s1: str, s2: str) -> float:
         """Determine the pair correlation of two ionic species."""
         corr = self.sub_prob(s1, s2)
-        corr /= self.sub_probs(s1).sum()
-        corr /= self.sub_probs(s2).sum()
+        corr /= self.row_sums[self._get_index(s1)] / self.Z
+        corr /= self.row_sums[self._get_index(s2)] / self.Z
         return corr
 
     def cond_sub_prob(self, s1: str, s2: str) -> float:
         """Calculate the probability of substitution of one species with another."""
-        return np.exp(self.get_lambda(s1, s2)) / np.exp(self.get_lambdas(s2)).sum()
+        j = self._get_index(s2)
+        i = self.spec_idx.get(s1)
+        exp_lambda = self.exp_lambda_mat[i, j] if i is not None else np.exp(self.alpha(s1, s2))
+        return exp_lambda / self.row_sums[j]
 
     def cond_sub_probs(self, s1: str) -> pd.Series:
         """
@@ -391,10 +654,32 @@ class CationMutator:
         others in the lambda table.
 
         """
-        probs = self.get_lambdas(s1)
-        probs = np.exp(probs)
-        probs /= np.exp(self.lambda_tab).sum()
-        return probs
+        i = self._get_index(s1)
+        return pd.Series(self.exp_lambda_mat[i] / self.col_sums, index=self.lambda_tab.columns, name=s1)
+
+    def cond_sub_probs_many(self, species: Sequence[str]) -> pd.DataFrame:
+        """
+        Calculate the probabilities of substitution of several species.
+
+        The matrix analogue of :meth:`cond_sub_probs`.
+
+        Args:
+        ----
+            species: A sequence of species strings.
+
+        Returns:
+        -------
+            A DataFrame indexed by `species`, whose rows are the
+            conditional substitution probabilities of each species
+            with every species in the lambda table.
+
+        """
+        idx = self.species_indices(species)
+        return pd.DataFrame(
+            self.exp_lambda_mat[idx] / self.col_sums,
+            index=pd.Index(species, name=self.lambda_tab.index.name),
+            columns=self.lambda_tab.columns,
+        )
 
     def unary_substitute(
         self,
@@ -415,16 +700,14 @@ class CationMutator:
             Tuples of (:class:`SmactStructure`, probability, original species, new species).
 
         """
+        specs = self.lambda_tab.columns
         for specie in structure.get_spec_strs():
-            cond_probs = self.cond_sub_probs(specie)
-            likely_probs = cond_probs.loc[cond_probs > thresh]
-
-            for new_spec, prob in likely_probs.items():
-                if any(
-                    [
-                        new_spec == specie,
-                        parse_spec(specie)[1] != parse_spec(new_spec)[1],
-                    ]
-                ):
-                    continue
-                yield (self._mutate_structure(structure, specie, new_spec), prob, specie, new_spec)
+            cond_probs = self.cond_sub_probs(specie).to_numpy()
+
+            # Same-charge substitutions only, compared by column index
+            likely = (cond_probs > thresh) & (self.spec_charges == parse_spec(specie)[1])
+            likely[specs == specie] = False
+
+            for j in np.flatnonzero(likely):
+                new_spec = specs[j]
+                yield (self._mutate_structure(structure, specie, new_spec), cond_probs[j], specie, new_spec)
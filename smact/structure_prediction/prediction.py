@@ -12,7 +12,11 @@ Todo:
 
 from __future__ import annotations
 
+import heapq
 import itertools
+import multiprocessing
+from functools import partial
+from operator import itemgetter
 from typing import TYPE_CHECKING
 
 import numpy as np
@@ -20,12 +24,35 @@ import numpy as np
 from .utilities import parse_spec, unparse_spec
 
 if TYPE_CHECKING:
-    from collections.abc import Generator
+    from collections.abc import Callable, Generator, Iterable, Sequence
+
+    import pandas as pd
 
     from .database import StructureDB
     from .mutation import CationMutator
     from .structure import SmactStructure
 
+# The predictor of each worker process of StructurePredictor.predict_structs_batch
+_predict_predictor = None
+
+
+def _init_predict_worker(predictor: StructurePredictor) -> None:
+    global _predict_predictor
+    _predict_predictor = predictor
+
+
+def _predict_chunk_worker(
+    targets: list[tuple[tuple[str, int], ...]],
+    thresh: float,
+    include_same: bool,
+) -> list[tuple[tuple[tuple[str, int], ...], SmactStructure, float, int]]:
+    return _predict_predictor._predict_chunk(targets, thresh, include_same)
+
+
+def _subset_key(species: Iterable[tuple[str, int]]) -> tuple[tuple[str, int], ...]:
+    """Sort species as in :meth:`~.StructureDB.get_with_species`, as a key."""
+    return tuple(sorted(species, key=lambda spec: (spec[0], -spec[1])))
+
 
 class StructurePredictor:
     """
@@ -65,6 +92,8 @@ class StructurePredictor:
         species: list[tuple[str, int]],
         thresh: float | None = 1e-3,
         include_same: bool | None = True,
+        *,
+        top_k: int | None = None,
     ) -> Generator[tuple[SmactStructure, float, SmactStructure], None, None]:
         """
         Predict structures for a combination of species.
@@ -78,6 +107,13 @@ class StructurePredictor:
             include_same: Whether to include unmodified structures
                 from the database, i.e. structures containing all the
                 same species. Defaults to True.
+            top_k (int): If given, only the `top_k` most likely structures are
+                yielded, from most to least likely. Parents are then searched
+                in decreasing order of the highest probability they could
+                achieve, and the search stops once no remaining parent could
+                beat the current `top_k` structures, so usually only part of
+                the database is read. Defaults to None, which yields every
+                structure above `thresh`, in database order.
 
         Yields:
         ------
@@ -87,30 +123,163 @@ class StructurePredictor:
         # For now, consider just structures with the same species, and unary substitutions.
         # This means we need only consider structures with a difference of 0 or 1 species.
 
+        sub_spec = itertools.combinations(species, len(species) - 1)
+        sub_spec = list(map(list, sub_spec))
+
+        if top_k is not None:
+            yield from self._predict_top_k(species, sub_spec, thresh, include_same, top_k)
+            return
+
+        # Fetch the identical structures and all potential parents at once
+        potential_unary_parents: list[list[tuple[int, SmactStructure]]] = self.db.get_with_species_many(
+            [species, *sub_spec] if include_same else sub_spec, self.table, return_ids=True
+        )
+
         if include_same:
-            for identical in self.db.get_with_species(species, self.table):
+            for _, identical in potential_unary_parents.pop(0):
                 yield (identical, 1.0, identical)
 
-        sub_spec = itertools.combinations(species, len(species) - 1)
-        sub_spec = list(map(list, sub_spec))
+        for mutated, p, parent, _ in self._unary_predictions(
+            species, zip(sub_spec, potential_unary_parents, strict=True), self.cm.cond_sub_probs, thresh
+        ):
+            yield (mutated, p, parent)
 
-        potential_unary_parents: list[list[SmactStructure]] = [
-            self.db.get_with_species(specs, self.table) for specs in sub_spec
-        ]
+    def _predict_top_k(
+        self,
+        species: list[tuple[str, int]],
+        sub_spec: list[list[tuple[str, int]]],
+        thresh: float,
+        include_same: bool,
+        top_k: int,
+    ) -> Generator[tuple[SmactStructure, float, SmactStructure], None, None]:
+        """
+        Predict the most likely structures, pruning parents by probability bounds.
 
-        for spec_idx, parents in enumerate(potential_unary_parents):
+        See :meth:`predict_structs`.
+
+        """
+        if top_k <= 0:
+            return
+
+        # A min-heap of the best candidates so far, as (probability, -order, candidate),
+        # so that earlier candidates win ties
+        heap = []
+        order = itertools.count()
+
+        def push(p: float, candidate: tuple):
+            entry = (p, -next(order), candidate)
+            if len(heap) < top_k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+        if include_same:
+            (identicals,) = self.db.get_with_species_many([species], self.table)
+            for identical in identicals:
+                push(1.0, (identical, None, None))
+
+        # The probability of a parent missing a species is at most the highest
+        # conditional probability of the species with another of the same charge
+        specs = self.cm.lambda_tab.columns
+        bounds, sub_probs = [], {}
+        for spec in sub_spec:
+            diff_spec = set(species) - set(spec)
+            if len(diff_spec) != 1:
+                continue
+            ((ele, charge),) = diff_spec
+            diff_spec_str = unparse_spec((ele, charge))
+            sub_probs[diff_spec_str] = self.cm.cond_sub_probs(diff_spec_str)
+            same_charge = (self.cm.spec_charges == charge) & (specs != diff_spec_str)
+            bounds.append((sub_probs[diff_spec_str].to_numpy()[same_charge].max(initial=0.0), spec))
+        bounds.sort(key=itemgetter(0), reverse=True)
+
+        for bound, spec in bounds:
+            if bound <= thresh or (len(heap) == top_k and bound <= heap[0][0]):
+                break
+
+            (parents,) = self.db.get_with_species_many([spec], self.table, return_ids=True)
+            for p, parent, _, alt_spec, diff_spec_str in self._unary_candidates(
+                species, [(spec, parents)], sub_probs.get, thresh
+            ):
+                # Substituting a species of the same charge only preserves
+                # the charge neutrality of well-decorated parents
+                if sum(x[1] * x[2] for x in parent.species) == 0:
+                    push(p, (parent, alt_spec, diff_spec_str))
+
+        # Only mutate the structures that made the cut
+        for p, _, (parent, alt_spec, diff_spec_str) in sorted(heap, reverse=True):
+            if alt_spec is None:
+                yield (parent, p, parent)
+            else:
+                yield (self.cm._mutate_structure(parent, alt_spec, diff_spec_str), p, parent)
+
+    def _unary_predictions(
+        self,
+        species: list[tuple[str, int]],
+        potential_unary_parents: Iterable[tuple[list[tuple[str, int]], list[tuple[int, SmactStructure]]]],
+        cond_sub_probs: Callable[[str], pd.Series | None],
+        thresh: float,
+    ) -> Generator[tuple[SmactStructure, float, SmactStructure, int], None, None]:
+        """
+        Predict structures by unary substitution of fetched parents.
+
+        See :meth:`_unary_candidates` for arguments.
+
+        Yields:
+        ------
+            Potential structures, as tuples of (structure, probability, parent, parent rowid).
+
+        """
+        for p, parent, parent_id, alt_spec, diff_spec_str in self._unary_candidates(
+            species, potential_unary_parents, cond_sub_probs, thresh
+        ):
+            try:
+                mutated = self.cm._mutate_structure(parent, alt_spec, diff_spec_str)
+            except ValueError:
+                # Poorly decorated
+                continue
+            yield (mutated, p, parent, parent_id)
+
+    def _unary_candidates(
+        self,
+        species: list[tuple[str, int]],
+        potential_unary_parents: Iterable[tuple[list[tuple[str, int]], list[tuple[int, SmactStructure]]]],
+        cond_sub_probs: Callable[[str], pd.Series | None],
+        thresh: float,
+    ) -> Generator[tuple[float, SmactStructure, int, str, str], None, None]:
+        """
+        Find the unary substitutions of fetched parents, without mutating them.
+
+        Args:
+        ----
+            species: The constituent species of the target compound.
+            potential_unary_parents: Pairs of a subset of `species`, missing one
+                species, and the (rowid, structure) pairs containing the subset.
+            cond_sub_probs: Gets the conditional substitution probabilities of a
+                species, see :meth:`~.CationMutator.cond_sub_probs`, or None
+                to skip the species.
+            thresh: The probability threshold, below which to discard predictions.
+
+        Yields:
+        ------
+            Tuples of (probability, parent, parent rowid, species to replace,
+            replacement species).
+
+        """
+        for sub_spec, parents in potential_unary_parents:
             # Get missing ion
             # Ensure a different ion is obtained
-            if len(set(species) - set(sub_spec[spec_idx])) < 1:
+            if len(set(species) - set(sub_spec)) < 1:
                 continue
-            (diff_spec,) = set(species) - set(sub_spec[spec_idx])
+            (diff_spec,) = set(species) - set(sub_spec)
             diff_spec_str = unparse_spec(diff_spec)
 
             # Determine conditional substitution likelihoods
-            diff_sub_probs = self.cm.cond_sub_probs(diff_spec_str)
+            diff_sub_probs = cond_sub_probs(diff_spec_str)
+            if diff_sub_probs is None:
+                continue
 
-            for parent in parents:
-                # print("Testing parent")
+            for parent_id, parent in parents:
                 # Filter out any structures with identical species
                 if parent.has_species(diff_spec):
                     continue
@@ -137,16 +306,119 @@ class StructurePredictor:
                     continue
 
                 if p > thresh:
-                    try:
-                        self.cm._mutate_structure(parent, alt_spec, diff_spec_str)
-                    except ValueError:
-                        # Poorly decorated
-                        continue
-                    yield (
-                        self.cm._mutate_structure(parent, alt_spec, diff_spec_str),
-                        p,
-                        parent,
-                    )
+                    yield (p, parent, parent_id, alt_spec, diff_spec_str)
+
+    def predict_structs_batch(
+        self,
+        targets: Iterable[Sequence[tuple[str, int]]],
+        thresh: float | None = 1e-3,
+        include_same: bool | None = True,
+        *,
+        num_processes: int | None = 1,
+        chunksize: int = 256,
+    ) -> Generator[tuple[tuple[tuple[str, int], ...], SmactStructure, float, int], None, None]:
+        """
+        Predict structures for many combinations of species.
+
+        Equivalent to :meth:`predict_structs` for each target, but targets
+        are sorted and split into chunks, so that targets sharing species
+        subsets, e.g. those from a composition sweep, are predicted together.
+        Within a chunk, the parents of each subset are fetched from the
+        database in a single query, and the substitution probabilities of
+        each species are calculated once.
+
+        Unlike :meth:`predict_structs`, species missing from the lambda table
+        are skipped rather than raising an error, so that one unknown species
+        does not stop a sweep.
+
+        Args:
+        ----
+            targets: Lists of (element, charge), the constituent species
+                of each target compound.
+            thresh: The probability threshold, below which to discard
+                predictions.
+            include_same: Whether to include unmodified structures
+                from the database. Defaults to True.
+            num_processes (int): The number of worker processes. If None,
+                the number of CPUs is used. Defaults to 1, which runs in
+                the calling process. Workers open their own connections, so
+                the database cannot be in memory.
+            chunksize (int): The number of targets predicted together.
+
+        Yields:
+        ------
+            Tuples of (target, structure, probability, parent rowid), where the
+            target is a tuple of its species. Results are grouped by target,
+            in sorted order of the targets.
+
+        Raises:
+        ------
+            ValueError: Worker processes are requested for an in-memory database.
+
+        """
+        targets = sorted((tuple(map(tuple, target)) for target in targets), key=_subset_key)
+        chunks = [targets[i : i + chunksize] for i in range(0, len(targets), chunksize)]
+
+        if num_processes == 1:
+            for chunk in chunks:
+                yield from self._predict_chunk(chunk, thresh, include_same)
+            return
+
+        if self.db.db == ":memory:":
+            raise ValueError("In-memory databases cannot be shared with worker processes.")
+
+        predict = partial(_predict_chunk_worker, thresh=thresh, include_same=include_same)
+        with multiprocessing.Pool(
+            processes=(multiprocessing.cpu_count() if num_processes is None else num_processes),
+            initializer=_init_predict_worker,
+            initargs=(self,),
+        ) as pool:
+            for records in pool.imap(predict, chunks):
+                yield from records
+
+    def _predict_chunk(
+        self,
+        targets: list[tuple[tuple[str, int], ...]],
+        thresh: float,
+        include_same: bool,
+    ) -> list[tuple[tuple[tuple[str, int], ...], SmactStructure, float, int]]:
+        """
+        Predict structures for several targets, sharing database queries.
+
+        See :meth:`predict_structs_batch`.
+
+        """
+        # Every species subset to fetch, keyed as sorted by get_with_species_many
+        subsets = {}
+        for target in targets:
+            for spec in itertools.combinations(target, len(target) - 1):
+                subsets.setdefault(_subset_key(spec), spec)
+            if include_same:
+                subsets.setdefault(_subset_key(target), target)
+
+        fetched = self.db.get_with_species_many([list(spec) for spec in subsets.values()], self.table, return_ids=True)
+        parents = dict(zip(subsets, fetched, strict=True))
+
+        diff_specs = list(dict.fromkeys(unparse_spec(spec) for target in targets for spec in target))
+        probs = self.cm.cond_sub_probs_many([spec for spec in diff_specs if spec in self.cm.specs])
+
+        records = []
+        for target in targets:
+            if include_same:
+                records.extend((target, identical, 1.0, rowid) for rowid, identical in parents[_subset_key(target)])
+
+            sub_spec = [list(spec) for spec in itertools.combinations(target, len(target) - 1)]
+            records.extend(
+                (target, mutated, p, parent_id)
+                for mutated, p, _, parent_id in self._unary_predictions(
+                    list(target),
+                    ((spec, parents[_subset_key(spec)]) for spec in sub_spec),
+                    lambda spec: probs.loc[spec] if spec in probs.index else None,
+                    thresh,
+                )
+            )
+
+        return records
 
     def nary_predict_structs(
         self,
@@ -158,6 +430,12 @@ class StructurePredictor:
         """
         Predicts structures for a combination of species.
 
+        Parents are structures with the same anonymised charge pattern as the
+        target, found with :meth:`~.StructureDB.get_with_prototype`, that differ
+        from it by `n_ary` species. These are replaced by the missing species of
+        the target, and the probability of a parent is that of its most likely
+        charge-neutral assignment of species to sites.
+
         Args:
         ----
             species: A list of (element, charge). The constituent species
@@ -176,79 +454,82 @@ class StructurePredictor:
             for identical in self.db.get_with_species(species, self.table):
                 yield (identical, 1.0, identical)
 
-        # Ensure that we can obtain a subset of species of the target compound
-        if len(species) - n_ary == 0:
-            return None
-        sub_species = itertools.combinations(species, len(species) - n_ary)
-        sub_species = list(map(list, sub_species))
-
-        potential_nary_parents: list[list[SmactStructure]] = [
-            self.db.get_with_species(specs, self.table) for specs in sub_species
-        ]
-
-        for spec_idx, parents in enumerate(potential_nary_parents):
-            # Get missing ions
-            # Ensure we get the correct number of species
-            # Ensure the ions obtained are different
-            # if len(set(species) - set(sub_species[spec_idx])) !=2:
-            # continue
-            diff_species = list(set(species) - set(sub_species[spec_idx]))
-            diff_spec_str = [unparse_spec(i) for i in diff_species]
-
-            diff_sub_probs = [self.cm.cond_sub_probs(i) for i in diff_spec_str]
-
-            for parent in parents:
-                # print("testing parent")
-                # Filter out any structures with identical species
-                if n_ary == 1:
-                    if parent.has_species(diff_species[0]):
-                        continue
-                elif n_ary == 2:
-                    if parent.has_species(diff_species[0]) and parent.has_species(diff_species[1]):
-                        continue
-                elif n_ary == 3 and (
-                    parent.has_species(diff_species[0])
-                    and parent.has_species(diff_species[1])
-                    and parent.has_species(diff_species[2])
-                ):
-                    continue
+        target_strs = [unparse_spec(spec) for spec in species]
 
-                # Ensure parent has as many species as target
-                if len(parent.species) != len(species):
-                    continue
-
-                # Determine probability
-                # Get species to be substituted
-                # Ensure n species are obtained
+        # Group the parents by the species to replace, their stoichiometry, and the missing species
+        parents = []
+        substitutions = {}
+        for parent in self.db.get_with_prototype([charge for _, charge in species], self.table):
+            parent_strs = parent.get_spec_strs()
+            alt = [i for i, spec in enumerate(parent_strs) if spec not in target_strs]
+            alt_spec = tuple(parent_strs[i] for i in alt)
+            if len(alt_spec) != n_ary or not all(spec in self.cm.spec_idx for spec in alt_spec):
+                continue
+            stoics = tuple(parent.species[i][2] for i in alt)
+            diff_spec = tuple(spec for spec in target_strs if spec not in parent_strs)
+            parents.append((parent, substitutions.setdefault((alt_spec, stoics, diff_spec), len(substitutions))))
 
-                if len(set(parent.get_spec_strs()) - set(map(unparse_spec, species)) - set(diff_species)) != n_ary:
-                    continue
-                alt_spec = list(set(parent.get_spec_strs()) - set(map(unparse_spec, species)) - set(diff_species))
+        if not substitutions:
+            return
 
-                # Need to consider p(A,X)p(B,Y) and p(A,Y)p(B,X)
-                # if utilities.parse_spec(alt_spec_1)[1] != diff_species_1[1] and utilities.parse_spec(alt_spec_2)[1] != diff_species_2[1] :
-                # Different charge
-                # continue
+        subs = list(substitutions)
+        probs, assignments = self._best_assignments(subs, n_ary)
 
+        for parent, sub_idx in parents:
+            p = probs[sub_idx]
+            if p > thresh:
+                alt_spec, _, diff_spec = subs[sub_idx]
                 try:
-                    p = []
-                    for i in range(n_ary):
-                        p.append(diff_sub_probs[i].loc[alt_spec[i]])
-                except:
-                    # Not in the Series
+                    mutated = self.cm._nary_mutate_structure(
+                        parent, [alt_spec[j] for j in assignments[sub_idx]], list(diff_spec)
+                    )
+                except ValueError:
+                    # Poorly decorated
                     continue
+                yield (mutated, p, parent)
 
-                p = np.prod(p)
+    def _best_assignments(
+        self,
+        substitutions: list[tuple[tuple[str, ...], tuple[int, ...], tuple[str, ...]]],
+        n_ary: int,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the most likely assignment of new species to the sites of old ones.
 
-                if p > thresh:
-                    try:
-                        self.cm._nary_mutate_structure(parent, alt_spec, diff_spec_str)
-
-                    except ValueError:
-                        # Poorly decorated
-                        continue
-                    yield (
-                        self.cm._nary_mutate_structure(parent, alt_spec, diff_spec_str),
-                        p,
-                        parent,
-                    )
+        Every permutation of every substitution is scored at once. Assignments
+        that change the total charge of the parent score zero.
+
+        Args:
+        ----
+            substitutions: Tuples of `n_ary` species to replace, their
+                stoichiometries in the parent, and `n_ary` species to replace
+                them with.
+            n_ary: The number of species replaced.
+
+        Returns:
+        -------
+            The probability of the best assignment of each substitution, and the
+            assignment, as the index of the species replaced by each new species.
+
+        """
+        perms = np.array(list(itertools.permutations(range(n_ary))), dtype=np.intp).reshape(-1, n_ary)
+        alt_idx = self.cm.species_indices([spec for alt_spec, _, _ in substitutions for spec in alt_spec])
+        diff_idx = self.cm.species_indices([spec for _, _, diff_spec in substitutions for spec in diff_spec])
+        alt_idx = alt_idx.reshape(-1, n_ary)
+        diff_idx = diff_idx.reshape(-1, n_ary)
+        stoics = np.array([stoics for _, stoics, _ in substitutions]).reshape(-1, n_ary)
+
+        # probs[s, i, j]: the probability of new species i replacing old species j
+        probs = (
+            self.cm.exp_lambda_mat[diff_idx[:, :, None], alt_idx[:, None, :]] / self.cm.col_sums[alt_idx][:, None, :]
+        )
+        # charge_change[s, i, j]: the change in total charge if new species i replaces old species j
+        charges = self.cm.spec_charges
+        charge_change = stoics[:, None, :] * (charges[diff_idx][:, :, None] - charges[alt_idx][:, None, :])
+
+        # scores[s, k]: the probability of permutation k
+        rows = np.arange(n_ary)
+        scores = probs[:, rows, perms].prod(axis=2)
+        scores[charge_change[:, rows, perms].sum(axis=2) != 0] = 0.0
+        best = scores.argmax(axis=1)
+        return scores[np.arange(len(substitutions)), best], perms[best]
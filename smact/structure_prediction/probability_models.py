@@ -21,9 +21,10 @@ import abc
 import os
 from itertools import combinations_with_replacement
 
+import numpy as np
 import pandas as pd
 
-from smact import data_directory
+from smact import data_directory, data_loader
 
 from .utilities import parse_spec
 
@@ -94,6 +95,8 @@ class RadiusModel(SubstitutionModel):
 
         self.k = (self.shannon_data["ionic_radius"].max() - self.shannon_data["ionic_radius"].min()) ** -2
 
+        self._elements = set(self.shannon_data.index)
+
     def sub_prob(self, s1, s2):
         r"""
         Calculate the probability of substituting species s1 for s2.
@@ -114,21 +117,16 @@ class RadiusModel(SubstitutionModel):
             The probability of substitution.
 
         """
-        spec1 = parse_spec(s1)
-        spec2 = parse_spec(s2)
-
-        try:
-            ele1_rows = self.shannon_data.loc[spec1[0]]
-            ele2_rows = self.shannon_data.loc[spec2[0]]
-        except KeyError as e:
-            raise KeyError(f"Element not in Shannon radius data file: {e}")
+        # Use mean radii so we don't need coordination information
+        mean_radii = []
+        for ele, charge in (parse_spec(s1), parse_spec(s2)):
+            if ele not in self._elements:
+                raise KeyError(f"Element not in Shannon radius data file: {ele!r}")
 
-        spec1_rows = ele1_rows.loc[ele1_rows["charge"] == spec1[1]]
-        spec2_rows = ele2_rows.loc[ele2_rows["charge"] == spec2[1]]
+            avg_radii = data_loader.lookup_species_average_shannon_radii(ele, charge)
+            mean_radii.append(avg_radii[1] if avg_radii is not None else np.nan)
 
-        # Get mean so we don't need coordination information
-        mean_spec1_r = spec1_rows["ionic_radius"].mean()
-        mean_spec2_r = spec2_rows["ionic_radius"].mean()
+        mean_spec1_r, mean_spec2_r = mean_radii
 
         # Hooke's law-style probability
         return 1 - self.k * (mean_spec1_r - mean_spec2_r) ** 2
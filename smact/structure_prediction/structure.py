@@ -2,17 +2,25 @@
 
 from __future__ import annotations
 
+import hashlib
+import multiprocessing
 import os
 import re
-from collections import defaultdict
-from functools import reduce
+import struct
+import sys
+import threading
+import zlib
+from collections import OrderedDict, defaultdict
+from functools import cache, partial, reduce
 from math import gcd
 from operator import itemgetter
+from string import ascii_uppercase
+from typing import TYPE_CHECKING
 
 import numpy as np
 import pymatgen
 from pymatgen.analysis.bond_valence import BVAnalyzer
-from pymatgen.core import SETTINGS
+from pymatgen.core import SETTINGS, Composition, Element, Lattice
 from pymatgen.core import Structure as pmg_Structure
 from pymatgen.ext.matproj import MPRester
 from pymatgen.transformations.standard_transformations import (
@@ -21,8 +29,180 @@ from pymatgen.transformations.standard_transformations import (
 
 import smact
 
+from . import logger
 from .utilities import get_sign
 
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+# Binary structure encoding, see SmactStructure.as_bytes
+BINARY_MAGIC = b"SMS"
+BINARY_FORMAT_VERSION = 1
+_BINARY_COMPRESSED = 0x01
+_BINARY_HEADER = struct.Struct("<3sBB")
+_BINARY_SPECIES = struct.Struct("<bII")
+
+# Methods of assigning oxidation states, see SmactStructure.from_py_struct
+DECORATION_METHODS = ("BV", "comp_ICSD", "both", "predecorated")
+
+# Decorated species strings of each site, or the error message, keyed by
+# (structure digest, method), see py_struct_digest
+DECORATION_CACHE_SIZE = 10000
+_decoration_cache: OrderedDict[tuple[str, str], tuple[str, ...] | str] = OrderedDict()
+_decoration_lock = threading.Lock()
+
+# BVAnalyzer keeps the state of its search, so each thread reuses its own
+_bv_local = threading.local()
+
+# Electronegativity difference below which the two most electronegative
+# elements are grouped as a polyanion, as in pymatgen's reduced formulae
+_POLYANION_ENEG_DIFF = 1.65
+
+
+@cache
+def _eneg(symbol: str) -> float:
+    """Get the pymatgen electronegativity of an element, used to order formulae."""
+    return Element(symbol).X
+
+
+class DecorationError(ValueError):
+    """A structure could not be decorated with oxidation states."""
+
+
+def _bv_analyzer() -> BVAnalyzer:
+    """Get the bond valence analyzer of the current thread."""
+    analyzer = getattr(_bv_local, "analyzer", None)
+    if analyzer is None:
+        analyzer = _bv_local.analyzer = BVAnalyzer()
+    return analyzer
+
+
+def py_struct_digest(structure: pymatgen.core.Structure) -> str:
+    """
+    Hash the lattice, fractional coordinates and species of a pymatgen Structure.
+
+    Args:
+    ----
+        structure: A pymatgen Structure.
+
+    Returns:
+    -------
+        str: A hexadecimal digest, identical for identical structures.
+
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(structure.lattice.matrix, dtype="<f8").tobytes())
+    digest.update(np.ascontiguousarray(structure.frac_coords, dtype="<f8").tobytes())
+    digest.update("\0".join(site.species_string for site in structure).encode())
+    return digest.hexdigest()
+
+
+def _check_decoration_method(method: str):
+    """Raise a ValueError if `method` is not one of :data:`DECORATION_METHODS`."""
+    if method not in DECORATION_METHODS:
+        raise ValueError(
+            f"Argument for 'determine_oxi', <{method}> is not valid. Choose either 'BV','comp_ICSD','both' or 'predecorated'."
+        )
+
+
+def _decorate_by_icsd(structure: pymatgen.core.Structure) -> pymatgen.core.Structure:
+    """Decorate a structure with the most likely oxidation states of its composition."""
+    oxi_transform = OxidationStateDecorationTransformation(structure.composition.oxi_state_guesses()[0])
+    return oxi_transform.apply_transformation(structure)
+
+
+def _decorate_sites(structure: pymatgen.core.Structure, method: str) -> tuple[str, ...]:
+    """
+    Get the decorated species string of each site of a structure, without caching.
+
+    Args:
+    ----
+        structure: A pymatgen Structure.
+        method: See :meth:`SmactStructure.from_py_struct`.
+
+    Returns:
+    -------
+        The species strings, in the order of the sites.
+
+    Raises:
+    ------
+        DecorationError: The oxidation states could not be assigned.
+
+    """
+    try:
+        if method == "BV":
+            structure = _bv_analyzer().get_oxi_state_decorated_structure(structure)
+
+        elif method == "comp_ICSD":
+            structure = _decorate_by_icsd(structure)
+            logger.debug("Charge assigned based on ICSD statistics")
+
+        elif method == "both":
+            try:
+                structure = _bv_analyzer().get_oxi_state_decorated_structure(structure)
+                logger.debug("Oxidation states assigned using bond valence")
+            except ValueError:
+                structure = _decorate_by_icsd(structure)
+                logger.debug("Oxidation states assigned based on ICSD statistics")
+
+    except (ValueError, IndexError) as e:
+        raise DecorationError(f"Couldn't decorate {structure.formula} with oxidation states: {e}") from e
+
+    return tuple(sys.intern(site.species_string) for site in structure)
+
+
+def _decorate_worker(structure: pymatgen.core.Structure, method: str) -> tuple[str, ...] | str:
+    """Decorate a structure, returning the error message on failure."""
+    try:
+        return _decorate_sites(structure, method)
+    except DecorationError as e:
+        return str(e)
+
+
+def _cache_decoration(key: tuple[str, str], decoration: tuple[str, ...] | str):
+    """Add a decoration, or the message of a failed one, to the cache."""
+    with _decoration_lock:
+        _decoration_cache[key] = decoration
+        _decoration_cache.move_to_end(key)
+        while len(_decoration_cache) > DECORATION_CACHE_SIZE:
+            _decoration_cache.popitem(last=False)
+
+
+def _cached_decoration(key: tuple[str, str]) -> tuple[str, ...] | str | None:
+    """Get a cached decoration, or the message of a failed one."""
+    with _decoration_lock:
+        decoration = _decoration_cache.get(key)
+        if decoration is not None:
+            _decoration_cache.move_to_end(key)
+        return decoration
+
+
+def _reduce_formula(ele_stoics: dict[str, int]) -> tuple[str, int]:
+    """
+    Reduce a formula, following :func:`pymatgen.core.composition.reduce_formula`.
+
+    Args:
+    ----
+        ele_stoics: Dictionary of {element: stoichiometry}.
+
+    Returns:
+    -------
+        The reduced formula and the factor by which it was reduced.
+
+    """
+    syms = sorted(ele_stoics, key=lambda sym: [_eneg(sym), sym])
+    factor = reduce(gcd, ele_stoics.values())
+
+    poly_anion = ""
+    if len(syms) >= 3 and _eneg(syms[-1]) - _eneg(syms[-2]) < _POLYANION_ENEG_DIFF:
+        poly_form, poly_factor = _reduce_formula({sym: ele_stoics[sym] // factor for sym in syms[-2:]})
+        if poly_factor != 1:
+            poly_anion = f"({poly_form}){poly_factor}"
+            syms = syms[:-2]
+
+    formula = "".join(f"{sym}{ele_stoics[sym] // factor if ele_stoics[sym] != factor else ''}" for sym in syms)
+    return formula + poly_anion, factor
+
 
 class SmactStructure:
     """
@@ -40,9 +220,15 @@ class SmactStructure:
             alphabetically based on element symbol, and identical elements
             are sorted with highest charge first.
         lattice_mat: A numpy 3x3 array containing the lattice vectors.
+        coords: A numpy (N, 3) float64 array of the Cartesian coordinates
+            of every site.
+        site_species: A numpy integer array of length N, giving the index
+            in :attr:`species` of the species occupying each site.
         sites: A dictionary of {species: coords}, where species is a string
             representation of the species and coords is a list of position
-            vectors, given as lists of length 3. For example:
+            vectors, given as lists of length 3. This is a view of
+            :attr:`coords` and :attr:`site_species`, built on access;
+            assigning it replaces both. For example:
 
             >>> s = SmactStructure.from_file("tests/files/NaCl.txt")
             >>> s.sites
@@ -79,10 +265,73 @@ class SmactStructure:
 
         self.lattice_mat = lattice_mat
 
-        self.sites = {spec: sites[spec] for spec in self.get_spec_strs()}  # Sort sites
+        self.sites = sites
 
         self.lattice_param = lattice_param
 
+    @property
+    def sites(self) -> dict[str, list[list[float]]]:
+        """See :class:`~.SmactStructure`."""
+        return {spec: self.coords[self.site_species == i].tolist() for i, spec in enumerate(self.get_spec_strs())}
+
+    @sites.setter
+    def sites(self, sites: dict[str, list[list[float]]]):
+        coords = [np.asarray(sites[spec], dtype=np.float64).reshape(-1, 3) for spec in self.get_spec_strs()]
+        self.coords = np.concatenate(coords)
+        self.site_species = np.repeat(np.arange(len(coords), dtype=np.intp), [len(c) for c in coords])
+
+    @staticmethod
+    def from_arrays(
+        species: list[tuple[str, int, int]],
+        lattice_mat: np.ndarray,
+        coords: np.ndarray,
+        site_species: np.ndarray,
+        lattice_param: float | None = 1.0,
+    ):
+        """
+        Create a SmactStructure from arrays of sites, without copying them.
+
+        Args:
+        ----
+            species: Sanitised species, see :class:`~.SmactStructure`.
+            lattice_mat: See :class:`~.SmactStructure`.
+            coords: See :class:`~.SmactStructure`.
+            site_species: See :class:`~.SmactStructure`.
+            lattice_param: See :class:`~.SmactStructure`.
+
+        Returns:
+        -------
+            :class:`~.SmactStructure`
+
+        Raises:
+        ------
+            ValueError: The site arrays have inconsistent shapes.
+
+        """
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+        site_species = np.asarray(site_species, dtype=np.intp)
+        if site_species.shape != (len(coords),):
+            raise ValueError(f"Got {len(coords)} coordinates for {site_species.size} sites.")
+
+        struct = SmactStructure.__new__(SmactStructure)
+        struct.species = species
+        struct.lattice_mat = lattice_mat
+        struct.coords = coords
+        struct.site_species = site_species
+        struct.lattice_param = lattice_param
+        return struct
+
+    def __setstate__(self, state: dict):
+        """Restore a pickled structure, converting the sites dictionary of older versions."""
+        sites = state.pop("sites", None)
+        self.__dict__.update(state)
+        if sites is not None:
+            self.sites = sites
+
+    def _site_order(self) -> np.ndarray:
+        """Get the indices that order the sites by species, as in a POSCAR."""
+        return np.argsort(self.site_species, kind="stable")
+
     def __repr__(self):
         """
         Represent the structure as a POSCAR.
@@ -110,21 +359,17 @@ class SmactStructure:
         if not isinstance(other, SmactStructure):
             return False
 
-        sites_equal = True
-        for si, sj in zip(self.sites.values(), other.sites.values(), strict=False):
-            for ci, cj in zip(si, sj, strict=False):
-                if not np.allclose(ci, cj, atol=1e-7):
-                    sites_equal = False
-                    break
-
-        return all(
-            [
-                self.species == other.species,
-                np.array_equal(self.lattice_mat, other.lattice_mat),
-                self.lattice_param == other.lattice_param,
-                sites_equal,
-                list(self.sites.keys()) == list(other.sites.keys()),
-            ]
+        if not (
+            self.species == other.species
+            and np.array_equal(self.lattice_mat, other.lattice_mat)
+            and self.lattice_param == other.lattice_param
+            and len(self.site_species) == len(other.site_species)
+        ):
+            return False
+
+        order, other_order = self._site_order(), other._site_order()
+        return np.array_equal(self.site_species[order], other.site_species[other_order]) and np.allclose(
+            self.coords[order], other.coords[other_order], atol=1e-7
         )
 
     @staticmethod
@@ -182,6 +427,7 @@ class SmactStructure:
     @staticmethod
     def __parse_py_sites(
         structure: pymatgen.core.Structure,
+        labels: Iterable[str] | None = None,
     ) -> tuple[dict[str, list[list[float]]], list[tuple[str, int, int]]]:
         """
         Parse the sites of a pymatgen Structure.
@@ -189,6 +435,8 @@ class SmactStructure:
         Args:
         ----
             structure: A :class:`pymatgen.core.Structure` instance.
+            labels: The species string of each site. Defaults to
+                those of the structure.
 
         Returns:
         -------
@@ -204,9 +452,11 @@ class SmactStructure:
         if not isinstance(structure, pymatgen.core.Structure):
             raise TypeError("structure must be a pymatgen.core.Structure instance.")
 
+        if labels is None:
+            labels = (site.species_string for site in structure)
+
         sites = defaultdict(list)
-        for site in structure.sites:
-            site_type = site.species_string
+        for site_type, coords in zip(labels, structure.cart_coords.tolist(), strict=True):
             # Add charge magnitude, for cases of unit charge
             if all(
                 [
@@ -216,7 +466,7 @@ class SmactStructure:
             ):
                 site_type = site_type[:-1] + "1" + site_type[-1]
 
-            sites[site_type].append(site.coords.tolist())
+            sites[site_type].append(coords)
 
         sites = dict(sites)
 
@@ -251,47 +501,63 @@ class SmactStructure:
             structure: A pymatgen Structure.
             determine_oxi (str): The method to determine the assignments oxidation states in the structure.
                 Options are 'BV', 'comp_ICSD','both' for determining the oxidation states by bond valence,
-                ICSD statistics or trial both sequentially, respectively.
+                ICSD statistics or trial both sequentially, respectively. Decorations are cached by
+                :func:`py_struct_digest`, so repeated structures are only decorated once.
 
         Returns:
         -------
             :class:`~.SmactStructure`
 
+        Raises:
+        ------
+            DecorationError: The oxidation states could not be assigned.
+
         """
         if not isinstance(structure, pymatgen.core.Structure):
             raise TypeError("Structure must be a pymatgen.core.Structure instance.")
+        _check_decoration_method(determine_oxi)
 
-        if determine_oxi == "BV":
-            bva = BVAnalyzer()
-            struct = bva.get_oxi_state_decorated_structure(structure)
+        if determine_oxi == "predecorated":
+            return SmactStructure._from_py_decoration(structure, None)
 
-        elif determine_oxi == "comp_ICSD":
-            comp = structure.composition
-            oxi_transform = OxidationStateDecorationTransformation(comp.oxi_state_guesses()[0])
-            struct = oxi_transform.apply_transformation(structure)
-            print("Charge assigned based on ICSD statistics")
+        key = (py_struct_digest(structure), determine_oxi)
+        decoration = _cached_decoration(key)
+        if decoration is None:
+            decoration = _decorate_worker(structure, determine_oxi)
+            _cache_decoration(key, decoration)
 
-        elif determine_oxi == "both":
-            try:
-                bva = BVAnalyzer()
-                struct = bva.get_oxi_state_decorated_structure(structure)
-                print("Oxidation states assigned using bond valence")
-            except ValueError:
-                comp = structure.composition
-                oxi_transform = OxidationStateDecorationTransformation(comp.oxi_state_guesses()[0])
-                struct = oxi_transform.apply_transformation(structure)
-                print("Oxidation states assigned based on ICSD statistics")
-        elif determine_oxi == "predecorated":
-            struct = structure
+        return SmactStructure._from_py_decoration(structure, decoration)
 
-        else:
-            raise ValueError(
-                f"Argument for 'determine_oxi', <{determine_oxi}> is not valid. Choose either 'BV','comp_ICSD','both' or 'predecorated'."
-            )
+    @staticmethod
+    def _from_py_decoration(
+        structure: pymatgen.core.Structure,
+        decoration: tuple[str, ...] | str | None,
+    ) -> SmactStructure:
+        """
+        Create a SmactStructure from a pymatgen Structure and its decoration.
 
-        sites, species = SmactStructure.__parse_py_sites(struct)
+        Args:
+        ----
+            structure: A pymatgen Structure.
+            decoration: The decorated species string of each site, the
+                message of a failed decoration, or None if the structure is
+                already decorated.
 
-        lattice_mat = struct.lattice.matrix
+        Returns:
+        -------
+            :class:`~.SmactStructure`
+
+        Raises:
+        ------
+            DecorationError: The decoration failed.
+
+        """
+        if isinstance(decoration, str):
+            raise DecorationError(decoration)
+
+        sites, species = SmactStructure.__parse_py_sites(structure, decoration)
+
+        lattice_mat = structure.lattice.matrix
 
         lattice_param = 1.0
 
@@ -357,8 +623,7 @@ class SmactStructure:
 
         if 0 not in (spec[1] for spec in sanit_species):  # If everything's charged
             if determine_oxi == "BV":
-                bva = BVAnalyzer()
-                struct = bva.get_oxi_state_decorated_structure(struct)
+                struct = _bv_analyzer().get_oxi_state_decorated_structure(struct)
 
             elif determine_oxi == "comp_ICSD":
                 comp = struct.composition
@@ -368,8 +633,7 @@ class SmactStructure:
 
             elif determine_oxi == "both":
                 try:
-                    bva = BVAnalyzer()
-                    struct = bva.get_oxi_state_decorated_structure(struct)
+                    struct = _bv_analyzer().get_oxi_state_decorated_structure(struct)
                     print("Oxidation states assigned using bond valence")
                 except ValueError:
                     comp = struct.composition
@@ -452,20 +716,73 @@ class SmactStructure:
 
         lattice = np.array([[float(point) for point in line.split(" ")] for line in lines[2:5]])
 
-        sites = defaultdict(list)
-        for line in lines[8:]:
-            if not line:  # EOF
-                break
+        site_lines = lines[8:]
+        if "" in site_lines:  # EOF
+            site_lines = site_lines[: site_lines.index("")]
+        tokens = " ".join(site_lines).split(" ") if site_lines else []
+        labels = tokens[3::4]
+        del tokens[3::4]
+        coords = np.array(tokens, dtype=np.float64).reshape(-1, 3)
 
-            split_line = line.split(" ")
-            coords = [float(x) for x in split_line[:3]]
-            spec = split_line[-1]
+        species = SmactStructure._sanitise_species(species)
+        spec_idx = {spec: i for i, spec in enumerate(SmactStructure._spec_strs(species))}
+        site_species = np.fromiter(map(spec_idx.__getitem__, labels), dtype=np.intp, count=len(labels))
 
-            sites[spec].append(coords)
+        order = np.argsort(site_species, kind="stable")
+        return SmactStructure.from_arrays(species, lattice, coords[order], site_species[order], lattice_param)
 
-        sites = dict(sites)
+    @staticmethod
+    def from_bytes(data: bytes):
+        """
+        Create SmactStructure from its binary encoding.
+
+        Args:
+        ----
+            data: A binary encoding of a structure.
+                See :meth:`~.as_bytes` for format specification.
 
-        return SmactStructure(species, lattice, sites, lattice_param)
+        Returns:
+        -------
+            :class:`~.SmactStructure`
+
+        Raises:
+        ------
+            ValueError: `data` is not a structure encoding, or was written by a
+                newer version of the format.
+
+        """
+        if len(data) < _BINARY_HEADER.size:
+            raise ValueError("Data is too short to be an encoded structure.")
+        magic, version, flags = _BINARY_HEADER.unpack_from(data)
+        if magic != BINARY_MAGIC:
+            raise ValueError("Data is not an encoded structure.")
+        if version > BINARY_FORMAT_VERSION:
+            raise ValueError(f"Unsupported structure format version {version}.")
+
+        payload = memoryview(data)[_BINARY_HEADER.size :]
+        if flags & _BINARY_COMPRESSED:
+            payload = zlib.decompress(payload)
+
+        lattice_param, num_species = struct.unpack_from("<dH", payload)
+        offset = 10
+
+        species, site_counts = [], []
+        for _ in range(num_species):
+            ele_len = payload[offset]
+            ele = bytes(payload[offset + 1 : offset + 1 + ele_len]).decode()
+            offset += 1 + ele_len
+            charge, stoic, num_sites = _BINARY_SPECIES.unpack_from(payload, offset)
+            offset += _BINARY_SPECIES.size
+            species.append((ele, charge, stoic))
+            site_counts.append(num_sites)
+
+        floats = np.frombuffer(payload, dtype="<f8", offset=offset)
+        lattice = floats[:9].reshape(3, 3).copy()
+        coords = floats[9:].reshape(-1, 3).astype(np.float64)
+        site_species = np.repeat(np.arange(num_species, dtype=np.intp), site_counts)
+
+        # Species were sanitised before encoding
+        return SmactStructure.from_arrays(species, lattice, coords, site_species, lattice_param)
 
     def _format_style(
         self,
@@ -572,6 +889,11 @@ class SmactStructure:
         """
         return self._format_style("{ele}{charge}{sign}").split(" ")
 
+    @staticmethod
+    def _spec_strs(species: list[tuple[str, int, int]]) -> list[str]:
+        """Get string representations of sanitised species, as :meth:`get_spec_strs`."""
+        return [f"{ele}{abs(charge) or ''}{get_sign(charge)}" for ele, charge, _ in species]
+
     def composition(self) -> str:
         """
         Generate a key that describes the composition.
@@ -625,20 +947,142 @@ class SmactStructure:
 
         poscar += "\n".join(" ".join(map(str, vec)) for vec in self.lattice_mat.tolist()) + "\n"
 
-        spec_count = {spec: len(coords) for spec, coords in self.sites.items()}
+        spec_strs = self.get_spec_strs()
+        spec_count = np.bincount(self.site_species, minlength=len(spec_strs))
 
         poscar += self._format_style("{ele}") + "\n"
 
-        poscar += " ".join(str(spec_count[spec]) for spec in self.get_spec_strs()) + "\n"
+        poscar += " ".join(map(str, spec_count.tolist())) + "\n"
 
         poscar += "Cartesian\n"
-        for spec, coords in self.sites.items():
-            for coord in coords:
-                poscar += " ".join(map(str, coord))
-                poscar += f" {spec}\n"
+        order = self._site_order()
+        coord_strs = list(map(str, self.coords[order].ravel().tolist()))
+        labels = [spec_strs[i] for i in self.site_species[order].tolist()]
+        poscar += "".join(
+            f"{line}\n"
+            for line in map(" ".join, zip(coord_strs[0::3], coord_strs[1::3], coord_strs[2::3], labels, strict=True))
+        )
 
         return poscar
 
+    def as_bytes(self, compress: bool = False) -> bytes:
+        """
+        Represent the structure as a compact binary encoding.
+
+        The encoding is lossless and much faster to decode than a POSCAR.
+        It starts with a header of the magic bytes ``b"SMS"``, the format
+        version (:data:`BINARY_FORMAT_VERSION`) and a flags byte, whose lowest
+        bit indicates that the rest of the data is zlib-compressed. The
+        payload, in little-endian byte order, is:
+
+        - the lattice parameter (float64) and the number of species (uint16);
+        - for each species, in the order of :attr:`species`, the length of the
+          element symbol (uint8), the UTF-8 symbol, the charge (int8), the
+          stoichiometry (uint32) and the number of sites (uint32);
+        - the lattice matrix, as 9 float64 in row-major order;
+        - the Cartesian coordinates of every site, as float64 triples,
+          grouped by species in the same order.
+
+        Args:
+        ----
+            compress (bool): Whether to compress the payload. Defaults to False.
+
+        Returns:
+        -------
+            bytes: Binary representation of the structure.
+
+        """
+        spec_count = np.bincount(self.site_species, minlength=len(self.species))
+        parts = [struct.pack("<dH", self.lattice_param, len(self.species))]
+        for (ele, charge, stoic), num_sites in zip(self.species, spec_count.tolist(), strict=True):
+            ele_bytes = ele.encode()
+            parts.append(bytes([len(ele_bytes)]) + ele_bytes)
+            parts.append(_BINARY_SPECIES.pack(int(charge), int(stoic), num_sites))
+
+        parts.append(np.asarray(self.lattice_mat, dtype="<f8").tobytes())
+        parts.append(np.asarray(self.coords[self._site_order()], dtype="<f8").tobytes())
+
+        payload = b"".join(parts)
+        flags = 0
+        if compress:
+            payload = zlib.compress(payload)
+            flags |= _BINARY_COMPRESSED
+
+        return _BINARY_HEADER.pack(BINARY_MAGIC, BINARY_FORMAT_VERSION, flags) + payload
+
+    def _geometry_source(self) -> SmactStructure:
+        """Get the structure whose lattice and coordinates this structure uses."""
+        return self
+
+    def _fingerprint_geometry(self, tol: float, niggli: bool) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Bucket the normalized lattice and fractional coordinates of the structure.
+
+        Args:
+        ----
+            tol: See :meth:`fingerprint`.
+            niggli: See :meth:`fingerprint`.
+
+        Returns:
+        -------
+            The bucketed lattice, as scaled lengths and cosines of the angles,
+                and the bucketed fractional coordinates of every site.
+
+        """
+        lattice = np.asarray(self.lattice_mat, dtype=np.float64)
+        if niggli:
+            lattice = Lattice(lattice).get_niggli_reduced_lattice().matrix
+
+        frac = np.linalg.solve(lattice.T, self.coords.T).T
+        num_buckets = max(1, round(1 / tol))
+        frac_key = np.rint((frac - np.floor(frac)) * num_buckets).astype("<i8") % num_buckets
+
+        # Scale to unit volume per site, so that the key is independent of
+        # the lattice parameter and of uniform expansion
+        lengths = np.linalg.norm(lattice, axis=1)
+        scale = np.cbrt(abs(np.linalg.det(lattice)) / max(len(frac), 1))
+        cosines = [lattice[i] @ lattice[j] / (lengths[i] * lengths[j]) for i, j in ((1, 2), (0, 2), (0, 1))]
+        lattice_key = np.rint(np.concatenate([lengths / scale, cosines]) / tol).astype("<i8")
+
+        return lattice_key, frac_key
+
+    def fingerprint(self, *, tol: float = 1e-2, niggli: bool = True) -> str:
+        """
+        Generate a canonical fingerprint of the structure, for use as a hash key.
+
+        The fingerprint covers the species, the lattice scaled to unit volume
+        per site, and the sorted fractional coordinates of the sites. Lattice
+        lengths, cosines of the lattice angles and fractional coordinates are
+        rounded to buckets of width `tol`, so structures that differ by less
+        than `tol` usually share a fingerprint. Values that lie close to a
+        bucket boundary may still be split, and an origin shift changes the
+        fingerprint.
+
+        Args:
+        ----
+            tol (float): The bucket width. Defaults to 0.01.
+            niggli (bool): Whether to Niggli-reduce the lattice first, making
+                the fingerprint independent of the choice of unit cell.
+                Defaults to True.
+
+        Returns:
+        -------
+            str: A hexadecimal digest.
+
+        """
+        return self._fingerprint_digest(*self._fingerprint_geometry(tol, niggli))
+
+    def _fingerprint_digest(self, lattice_key: np.ndarray, frac_key: np.ndarray) -> str:
+        """Hash the species and the bucketed geometry, see :meth:`fingerprint`."""
+        order = np.lexsort((frac_key[:, 2], frac_key[:, 1], frac_key[:, 0], self.site_species))
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr(self.species).encode())
+        digest.update(lattice_key.tobytes())
+        digest.update(self.site_species[order].astype("<i8").tobytes())
+        digest.update(frac_key[order].tobytes())
+        return digest.hexdigest()
+
     def as_py_struct(self) -> pymatgen.core.Structure:
         """
         Represent the structure as a pymatgen Structure object.
@@ -665,4 +1109,286 @@ class SmactStructure:
             CaTiO3
 
         """
-        return self.as_py_struct().composition.reduced_formula
+        formula, _ = _reduce_formula(self._get_ele_stoics(self.species))
+        return Composition.special_formulas.get(formula, formula)
+
+    def chemical_system(self) -> str:
+        """
+        Generate the chemical system of the structure.
+
+        Returns:
+        -------
+            str: The elements, sorted alphabetically and joined by dashes.
+
+        Examples:
+        --------
+            >>> s = SmactStructure.from_file("tests/files/CaTiO3.txt")
+            >>> print(s.chemical_system())
+            Ca-O-Ti
+
+        """
+        return "-".join(sorted({ele for ele, _, _ in self.species}))
+
+    def anonymized_formula(self) -> str:
+        """
+        Generate an anonymized formula for the structure.
+
+        Elements are ordered by increasing stoichiometry and assigned
+        ascending letters, as in pymatgen.
+
+        Returns:
+        -------
+            str: Anonymized formula of the structure.
+
+        Examples:
+        --------
+            >>> s = SmactStructure.from_file("tests/files/CaTiO3.txt")
+            >>> print(s.anonymized_formula())
+            ABC3
+
+        """
+        ele_stoics = self._get_ele_stoics(self.species)
+        factor = reduce(gcd, ele_stoics.values())
+        return "".join(
+            f"{letter}{stoic // factor if stoic != factor else ''}"
+            for letter, stoic in zip(ascii_uppercase, sorted(ele_stoics.values()), strict=False)
+        )
+
+
+class MutatedStructure(SmactStructure):
+    """
+    A lightweight view of a :class:`SmactStructure` with relabelled species.
+
+    Stores only the new species and a relabelling of the parent's species
+    strings; the lattice and site coordinates are those of the parent, and
+    are not copied. The :attr:`site_species` indices are remapped to the new
+    species on first access.
+
+    Assigning :attr:`lattice_mat`, :attr:`lattice_param`, :attr:`coords`,
+    :attr:`site_species` or :attr:`sites` replaces the attribute on the view
+    only, leaving the parent untouched. Coordinates are shared, however, so use
+    :meth:`materialize` to obtain an independent :class:`SmactStructure`
+    before modifying them in place.
+
+    Attributes:
+    ----------
+        parent: The structure that was mutated.
+
+    """
+
+    def __init__(
+        self,
+        parent: SmactStructure,
+        species: list[tuple[str, int, int]],
+        relabel: dict[str, str],
+    ):
+        """
+        Initialize a view of a structure with relabelled species.
+
+        Args:
+        ----
+            parent: The structure that was mutated.
+            species: The sorted species of the mutated structure,
+                see :class:`~.SmactStructure`.
+            relabel: A dictionary of {new species: parent species}, for the
+                species strings that were replaced.
+
+        """
+        self.parent = parent
+        self.species = species
+        self._relabel = relabel
+        self._lattice_mat = None
+        self._lattice_param = None
+        self._coords = None
+        self._site_species = None
+
+    @property
+    def lattice_mat(self) -> np.ndarray:
+        """The lattice vectors, shared with the parent unless reassigned."""
+        return self.parent.lattice_mat if self._lattice_mat is None else self._lattice_mat
+
+    @lattice_mat.setter
+    def lattice_mat(self, lattice_mat: np.ndarray):
+        self._lattice_mat = lattice_mat
+
+    @property
+    def lattice_param(self) -> float:
+        """The lattice parameter, shared with the parent unless reassigned."""
+        return self.parent.lattice_param if self._lattice_param is None else self._lattice_param
+
+    @lattice_param.setter
+    def lattice_param(self, lattice_param: float):
+        self._lattice_param = lattice_param
+
+    @property
+    def coords(self) -> np.ndarray:
+        """The site coordinates, shared with the parent unless reassigned."""
+        return self.parent.coords if self._coords is None else self._coords
+
+    @coords.setter
+    def coords(self, coords: np.ndarray):
+        self._coords = coords
+
+    @property
+    def site_species(self) -> np.ndarray:
+        """The indices of the new species occupying each of the parent's sites."""
+        if self._site_species is None:
+            spec_idx = {spec: i for i, spec in enumerate(self.get_spec_strs())}
+            relabelled = {old: new for new, old in self._relabel.items()}
+            parent_specs = self.parent.get_spec_strs()
+            remap = np.array([spec_idx[relabelled.get(spec, spec)] for spec in parent_specs], dtype=np.intp)
+            self._site_species = remap[self.parent.site_species]
+        return self._site_species
+
+    @site_species.setter
+    def site_species(self, site_species: np.ndarray):
+        self._site_species = site_species
+
+    def _geometry_source(self) -> SmactStructure:
+        """Get the parent's geometry source, unless the geometry was reassigned."""
+        if self._lattice_mat is None and self._coords is None:
+            return self.parent._geometry_source()
+        return self
+
+    def materialize(self) -> SmactStructure:
+        """
+        Copy the view into an independent :class:`SmactStructure`.
+
+        Returns:
+        -------
+            :class:`~.SmactStructure` equal to the view, sharing no data
+                with the parent.
+
+        """
+        return SmactStructure.from_arrays(
+            list(self.species),
+            np.array(self.lattice_mat, copy=True),
+            self.coords.copy(),
+            self.site_species.copy(),
+            self.lattice_param,
+        )
+
+
+def deduplicate(
+    items: Iterable,
+    *,
+    key: Callable[..., SmactStructure] | None = None,
+    tol: float = 1e-2,
+    niggli: bool = True,
+    recheck: bool = False,
+) -> Iterator:
+    """
+    Drop duplicate structures from a stream, in linear time.
+
+    Structures are compared by :meth:`SmactStructure.fingerprint`. The
+    geometry of each parent is only normalized once, so mutations of the
+    same structure, such as those returned by structure prediction, are
+    fingerprinted cheaply.
+
+    Args:
+    ----
+        items: The structures, or items containing them.
+        key: A function that gets the structure from an item, e.g.
+            ``operator.itemgetter(1)`` for the output of
+            :meth:`~.StructurePredictor.predict_structs_batch`. Defaults to
+            the items themselves.
+        tol: See :meth:`SmactStructure.fingerprint`.
+        niggli: See :meth:`SmactStructure.fingerprint`.
+        recheck: Whether to confirm that structures with the same
+            fingerprint are exactly equal before dropping them. Defaults to
+            False.
+
+    Yields:
+    ------
+        The first item with each distinct structure, in order.
+
+    """
+    seen: dict[str, list[SmactStructure]] = {}
+    # Keep the sources alive, so their ids are not reused
+    geometries: dict[int, tuple[SmactStructure, tuple[np.ndarray, np.ndarray]]] = {}
+
+    for item in items:
+        structure = item if key is None else key(item)
+
+        source = structure._geometry_source()
+        if id(source) not in geometries:
+            geometries[id(source)] = (source, source._fingerprint_geometry(tol, niggli))
+        fingerprint = structure._fingerprint_digest(*geometries[id(source)][1])
+
+        matches = seen.get(fingerprint)
+        if matches is None:
+            seen[fingerprint] = [structure] if recheck else []
+        elif recheck and not any(structure == match for match in matches):
+            matches.append(structure)
+        else:
+            continue
+
+        yield item
+
+
+def decorate_many(
+    structures: Iterable[pymatgen.core.Structure],
+    method: str = "BV",
+    *,
+    num_processes: int | None = 1,
+    chunksize: int = 16,
+) -> list[SmactStructure | DecorationError]:
+    """
+    Decorate many pymatgen Structures with oxidation states.
+
+    Equivalent to :meth:`SmactStructure.from_py_struct` for each structure,
+    but structures that are not in the decoration cache are decorated in
+    parallel, and identical structures are only decorated once.
+
+    Args:
+    ----
+        structures: The pymatgen Structures.
+        method: See :meth:`SmactStructure.from_py_struct`.
+        num_processes (int): The number of worker processes. If None, the
+            number of CPUs is used. Defaults to 1, which runs in the calling
+            process.
+        chunksize (int): The number of structures sent to a worker at once.
+
+    Returns:
+    -------
+        A :class:`~.SmactStructure` for each structure, in order, or the
+            :class:`DecorationError` if it could not be decorated.
+
+    """
+    _check_decoration_method(method)
+    structures = list(structures)
+
+    def convert(structure, decoration):
+        try:
+            return SmactStructure._from_py_decoration(structure, decoration)
+        except DecorationError as e:
+            return e
+
+    if method == "predecorated":
+        return [convert(structure, None) for structure in structures]
+
+    keys = [(py_struct_digest(structure), method) for structure in structures]
+    decorations = {}
+    pending = {}
+    for key, structure in zip(keys, structures, strict=True):
+        if key in decorations or key in pending:
+            continue
+        decoration = _cached_decoration(key)
+        if decoration is None:
+            pending[key] = structure
+        else:
+            decorations[key] = decoration
+
+    decorate = partial(_decorate_worker, method=method)
+    if num_processes == 1 or len(pending) <= 1:
+        decorations.update(zip(pending, map(decorate, pending.values()), strict=True))
+    else:
+        with multiprocessing.Pool(
+            processes=(multiprocessing.cpu_count() if num_processes is None else num_processes)
+        ) as pool:
+            decorations.update(zip(pending, pool.imap(decorate, pending.values(), chunksize), strict=True))
+
+    for key in pending:
+        _cache_decoration(key, decorations[key])
+
+    return [convert(structure, decorations[key]) for structure, key in zip(structures, keys, strict=True)]
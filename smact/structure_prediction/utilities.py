@@ -3,18 +3,95 @@
 from __future__ import annotations
 
 import re
+import threading
+from functools import lru_cache, reduce
+from math import gcd
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+# Interned species table. Every distinct (element, charge) pair gets a
+# compact integer id, and every species string that has been parsed maps
+# to the id of its pair.
+_species_table: list[tuple[str, int]] = []
+_species_ids: dict[tuple[str, int], int] = {}
+_species_str_ids: dict[str, int] = {}
+_species_lock = threading.Lock()
+
+_SPEC_RE = re.compile(r"([A-Za-z]+)([0-9]*[\+\-])")
+_ELE_RE = re.compile(r"[A-Za-z]+")
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def species_id(species: str) -> int:
+    """
+    Get the interned integer id of a species string.
+
+    Strings denoting the same species, e.g. "Fe+" and "Fe1+", share an id.
+    Ids are assigned on first use and are stable for the lifetime of the
+    process, but not between processes.
+
+    Args:
+    ----
+        species (str): The species string.
+
+    Returns:
+    -------
+        The id of the species.
+
+    """
+    try:
+        return _species_str_ids[species]
+    except KeyError:
+        pass
+
+    spec = _parse_spec(species)
+    with _species_lock:
+        idx = _species_ids.get(spec)
+        if idx is None:
+            idx = _species_ids[spec] = len(_species_table)
+            _species_table.append(spec)
+        _species_str_ids[species] = idx
+    return idx
+
+
+def species_from_id(idx: int) -> tuple[str, int]:
+    """
+    Get the (element, charge) tuple of an interned species id.
+
+    Args:
+    ----
+        idx (int): An id returned by :func:`species_id`.
+
+    Returns:
+    -------
+        A tuple of the atomic symbol and oxidation state.
+
+    """
+    return _species_table[idx]
 
 
 def parse_spec(species: str) -> tuple[str, int]:
     """
     Parse a species string into its atomic symbol and oxidation state.
 
+    Results are cached in the interned species table, see :func:`species_id`.
+
     :param species: the species string
     :return: a tuple of the atomic symbol and oxidation state
 
     """
     try:
-        ele, oxi_state = re.match(r"([A-Za-z]+)([0-9]*[\+\-])", species).groups()
+        return _species_table[_species_str_ids[species]]
+    except KeyError:
+        return _species_table[species_id(species)]
+
+
+def _parse_spec(species: str) -> tuple[str, int]:
+    """Parse a species string without the cache."""
+    try:
+        ele, oxi_state = _SPEC_RE.match(species).groups()
         if oxi_state[-1] in ["+", "-"]:
             charge = (int(oxi_state[:-1] or 1)) * (-1 if "-" in oxi_state else 1)
             return ele, charge
@@ -32,9 +109,9 @@ def _parse_spec_old(species: str) -> tuple[str, int]:
     :return: a tuple of the atomic symbol and oxidation state
 
     """
-    ele = re.match(r"[A-Za-z]+", species).group(0)
+    ele = _ELE_RE.match(species).group(0)
 
-    charge_match = re.search(r"\d+", species)
+    charge_match = _DIGITS_RE.search(species)
     ox_state = int(charge_match.group(0)) if charge_match else 0
 
     if "-" in species:
@@ -78,10 +155,15 @@ def unparse_spec(species: tuple[str, int], include_one: bool = True) -> str:
         'O2-'
 
     """
-    if include_one or abs(species[1]) != 1:
-        return f"{species[0]}{abs(species[1])}{get_sign(species[1])}"
+    return _unparse_spec(species[0], species[1], include_one)
+
+
+@lru_cache(maxsize=4096, typed=True)
+def _unparse_spec(element: str, charge: int, include_one: bool) -> str:
+    if include_one or abs(charge) != 1:
+        return f"{element}{abs(charge)}{get_sign(charge)}"
     else:
-        return f"{species[0]}{get_sign(species[1])}"
+        return f"{element}{get_sign(charge)}"
 
 
 def get_sign(charge: int) -> str:
@@ -103,3 +185,54 @@ def get_sign(charge: int) -> str:
         return "-"
     else:
         return ""
+
+
+def charge_pattern(charges: Iterable[int]) -> str:
+    """
+    Get an anonymised key describing a set of oxidation states.
+
+    Args:
+    ----
+        charges: The oxidation state of each species.
+
+    Returns:
+    -------
+        str: The charges, from highest to lowest.
+
+    Examples:
+    --------
+        >>> charge_pattern([2, -2, 4])
+        '4+ 2+ 2-'
+
+    """
+    return " ".join(f"{abs(charge)}{get_sign(charge)}" for charge in sorted(map(int, charges), reverse=True))
+
+
+def prototype_key(species: Iterable[tuple[str, int, int]]) -> str:
+    """
+    Get an anonymised key describing the charges and stoichiometry of a compound.
+
+    Compounds with the same key can be interconverted by substituting each
+    species with one of the same charge, e.g. CaTiO3 and SrSnO3.
+
+    Args:
+    ----
+        species: The species of the compound, as (element, charge, stoichiometry).
+
+    Returns:
+    -------
+        str: The charge and reduced stoichiometry of each species, from
+            highest to lowest charge.
+
+    Examples:
+    --------
+        >>> prototype_key([("Ca", 2, 2), ("Ti", 4, 2), ("O", -2, 6)])
+        '4+:1 2+:1 2-:3'
+
+    """
+    species = [(int(charge), int(stoic)) for _, charge, stoic in species]
+    divisor = reduce(gcd, (stoic for _, stoic in species), 0) or 1
+    return " ".join(
+        f"{abs(charge)}{get_sign(charge)}:{stoic // divisor}"
+        for charge, stoic in sorted(species, key=lambda x: (-x[0], x[1]))
+    )
@@ -53,6 +53,21 @@ class TestSequenceFunctions(unittest.TestCase):
         self.assertEqual(dictionary["W"].name, "Tungsten")
         self.assertTrue("Rn" in smact.element_dictionary())
 
+    def test_Species_radii(self):
+        Fe2 = Species("Fe", 2, coordination=6)
+        self.assertEqual(Fe2.shannon_radius, 0.84)
+        self.assertEqual(Fe2.ionic_radius, 0.7)
+        self.assertAlmostEqual(Fe2.average_shannon_radius, 0.8625)
+        self.assertAlmostEqual(Fe2.average_ionic_radius, 0.7225)
+
+        Fe2_extended = Species("Fe", 2, coordination=6, radii_source="extended")
+        self.assertEqual(Fe2_extended.shannon_radius, 0.75)
+        self.assertEqual(Fe2_extended.ionic_radius, 0.61)
+
+        self.assertIsNone(Species("Fe", 2, coordination=3).shannon_radius)
+        self.assertIsNone(smact.data_loader.lookup_species_shannon_radii("Fe", 2, 3))
+        self.assertIsNone(smact.data_loader.lookup_species_average_shannon_radii("Fe", 7))
+
     def test_are_eq(self):
         self.assertTrue(smact.are_eq([1.00, 2.00, 3.00], [1.001, 1.999, 3.00], tolerance=1e-2))
         self.assertFalse(smact.are_eq([1.00, 2.00, 3.00], [1.001, 1.999, 3.00]))
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 import os
+import shutil
+import tempfile
 import unittest
 
+import numpy as np
 import pytest
 
 from smact.dopant_prediction import doper
-from smact.structure_prediction import utilities
+from smact.structure_prediction import mutation, utilities
 
 files_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "files")
 TEST_LAMBDA_JSON = os.path.join(files_dir, "test_lambda_tab.json")
@@ -44,6 +47,50 @@ class DopantPredictionTest(unittest.TestCase):
             self.assertGreater(utilities.parse_spec(n_atom[0])[1], an_charge)
             self.assertLess(utilities.parse_spec(p_atom[0])[1], an_charge)
 
+    def test_dopant_prediction_default_table(self):
+        # Top dopants and number of candidates (n-cat, p-cat, n-an, p-an) with the default lambda table
+        expected = {
+            ("Zn2+", "S2-"): (
+                [
+                    ["Si4+", "Ge4+", "W6+", "Mo6+", "Re5+"],
+                    ["Na1+", "Cu1+", "K1+", "Li1+", "Ag1+"],
+                    ["Cl1-", "Br1-", "I1-", "F1-"],
+                    ["N3-"],
+                ],
+                [95, 9, 4, 1],
+            ),
+            ("Cu+", "Ga3+", "S2-"): (
+                [
+                    ["Se4+", "Ge4+", "Zr4+", "Si4+", "Ta5+"],
+                    ["Cs1+", "Ba2+", "Li1+", "Na1+", "Ag1+"],
+                    ["Cl1-", "Br1-", "I1-", "F1-"],
+                    ["N3-"],
+                ],
+                [33, 31, 4, 1],
+            ),
+            ("Ti4+", "O2-"): (
+                [
+                    ["Ta5+", "Nb5+", "Sb5+", "Ru5+", "Re5+"],
+                    ["Na1+", "Zn2+", "Mn2+", "Mg2+", "Fe3+"],
+                    ["F1-", "Cl1-", "Br1-", "I1-"],
+                    ["N3-"],
+                ],
+                [27, 69, 4, 1],
+            ),
+        }
+        for host, (top_dopants, num_candidates) in expected.items():
+            with self.subTest(host=host):
+                test = doper.Doper(host)
+                result = test.get_dopants()
+                self.assertEqual([[d[0] for d in v["sorted"]] for v in result.values()], top_dopants)
+
+                # Pairs left at the alpha floor of the table are not candidates
+                result = test.get_dopants(1000, group_by_charge=False)
+                self.assertEqual([len(v["sorted"]) for v in result.values()], num_candidates)
+                for v in result.values():
+                    for dopant, site, *_ in v["sorted"]:
+                        self.assertGreater(test.cation_mutator.get_lambda(dopant, site), test.lambda_threshold)
+
     def test_dopant_prediction_skipspecies(self):
         test_specie = ("Cu+", "Ga3+", "S2-")
         with pytest.raises(ValueError):
@@ -78,6 +125,121 @@ class DopantPredictionTest(unittest.TestCase):
             result = test.get_dopants()
             self.assertIsInstance(result, dict)
 
+    def test_bundled_binary_embeddings(self):
+        json_mutator = mutation.CationMutator.from_json(doper.SKIPSSPECIES_COSINE_SIM_PATH)
+        binary_mutator = doper.Doper(("Cu+", "Ga3+", "S2-"), embedding="skipspecies").cation_mutator
+
+        np.testing.assert_array_equal(binary_mutator.lambda_mat, json_mutator.lambda_mat)
+        self.assertEqual(list(binary_mutator.lambda_tab.index), list(json_mutator.lambda_tab.index))
+
+    def test_shared_cation_mutator(self):
+        test_specie = ("Cu+", "Ga3+", "S2-")
+        doper_1 = doper.Doper(test_specie, embedding="skipspecies")
+        doper_2 = doper.Doper(("Zn2+", "S2-"), embedding="skipspecies")
+        self.assertIs(doper_1.cation_mutator, doper_2.cation_mutator)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            lambda_json = shutil.copy(TEST_LAMBDA_JSON, tmp_dir)
+            cm = doper.get_cation_mutator(lambda_json)
+            self.assertIs(doper.get_cation_mutator(lambda_json), cm)
+            self.assertIsNot(doper.get_cation_mutator(lambda_json, alpha=-4.0), cm)
+
+            # A modified table is reloaded
+            mtime = os.path.getmtime(lambda_json)
+            os.utime(lambda_json, (mtime + 10, mtime + 10))
+            self.assertIsNot(doper.get_cation_mutator(lambda_json), cm)
+
+    def test_screen_hosts(self):
+        hosts = [("Cu+", "Ga3+", "S2-"), ("Zn2+", "S2-")]
+        # Top three (dopant, site, combined score) of each type with the skipspecies embedding
+        expected = {
+            ("Cu+", "Ga3+", "S2-"): {
+                "n-type cation substitutions": [
+                    ("Ge4+", "Ga3+", 0.737),
+                    ("Sn4+", "Ga3+", 0.7284),
+                    ("Si4+", "Ga3+", 0.6755),
+                ],
+                "p-type cation substitutions": [
+                    ("Ba2+", "Ga3+", 0.7881),
+                    ("Zn2+", "Ga3+", 0.7568),
+                    ("Cd2+", "Ga3+", 0.7511),
+                ],
+                "n-type anion substitutions": [("F1-", "S2-", 0.7531), ("Cl1-", "S2-", 0.7336), ("Br1-", "S2-", 0.713)],
+                "p-type anion substitutions": [
+                    ("N3-", "S2-", 0.5817),
+                    ("Ge4-", "S2-", 0.5593),
+                    ("As3-", "S2-", 0.5575),
+                ],
+            },
+            ("Zn2+", "S2-"): {
+                "n-type cation substitutions": [
+                    ("Ga3+", "Zn2+", 0.7568),
+                    ("Ge4+", "Zn2+", 0.7137),
+                    ("In3+", "Zn2+", 0.7118),
+                ],
+                "p-type cation substitutions": [
+                    ("Li1+", "Zn2+", 0.7253),
+                    ("Cu1+", "Zn2+", 0.7075),
+                    ("Ag1+", "Zn2+", 0.7041),
+                ],
+                "n-type anion substitutions": [("F1-", "S2-", 0.7531), ("Cl1-", "S2-", 0.7336), ("Br1-", "S2-", 0.713)],
+                "p-type anion substitutions": [
+                    ("N3-", "S2-", 0.5817),
+                    ("Ge4-", "S2-", 0.5593),
+                    ("As3-", "S2-", 0.5575),
+                ],
+            },
+        }
+        records = list(doper.Doper.screen_hosts(hosts, num_dopants=3, embedding="skipspecies"))
+
+        for host in hosts:
+            for dopant_type, dopants in expected[host].items():
+                rows = [r for r in records if r["host"] == host and r["type"] == dopant_type]
+                self.assertEqual([(r["dopant"], r["site"]) for r in rows], [d[:2] for d in dopants])
+                for r, d in zip(rows, dopants, strict=True):
+                    self.assertAlmostEqual(r["combined"], d[2], places=4)
+
+        parallel = list(doper.Doper.screen_hosts(hosts, num_dopants=3, embedding="skipspecies", num_processes=2))
+        self.assertEqual(parallel, records)
+
+        # Invalid options are rejected before any records are requested
+        with pytest.raises(ValueError):
+            doper.Doper.screen_hosts(hosts, embedding="skip")
+        with pytest.raises(ValueError):
+            doper.Doper.screen_hosts(hosts, num_processes=0)
+
+    def test_selectivity(self):
+        cations = ["Ba2+", "Ti4+"]
+        test = doper.Doper((*cations, "O2-"), embedding="skipspecies")
+        cm = test.cation_mutator
+        dopants = test.get_dopants(5)["n-type cation substitutions"]["sorted"]
+
+        # Dopants can be selective for either cation site
+        expected = [
+            ("Nb5+", "Ti4+", 0.58, 0.76507),
+            ("Ga3+", "Ba2+", 0.58, 0.68315),
+            ("Ta5+", "Ti4+", 0.54, 0.67827),
+            ("Bi3+", "Ba2+", 0.54, 0.63371),
+            ("Y3+", "Ba2+", 0.57, 0.59686),
+        ]
+        self.assertEqual([tuple(d[:2]) for d in dopants], [e[:2] for e in expected])
+        for (dopant, site, prob, _, selectivity, combined), (*_, exp_selectivity, exp_combined) in zip(
+            dopants, expected, strict=True
+        ):
+            self.assertAlmostEqual(selectivity, exp_selectivity)
+            self.assertAlmostEqual(combined, exp_combined, places=5)
+
+            other = sum(cm.sub_prob(cation, dopant) for cation in cations if cation != site)
+            self.assertAlmostEqual(selectivity, round(prob / (prob + other), 2))
+            self.assertAlmostEqual(combined, 0.75 * cm.get_lambda(dopant, site) + 0.25 * selectivity)
+
+    def test_top_k(self):
+        scores = np.array([0.1, 0.5, 0.3, 0.5, 0.2, 0.5])
+        np.testing.assert_array_equal(doper.Doper._top_k(scores, 2), [1, 3])
+        np.testing.assert_array_equal(doper.Doper._top_k(scores, 4), [1, 3, 5, 2])
+        np.testing.assert_array_equal(doper.Doper._top_k(scores, 10), np.argsort(-scores, kind="stable"))
+        self.assertEqual(len(doper.Doper._top_k(scores, 0)), 0)
+
     def test_format_number(self):
         test_specie = ("Cu+", "Ga3+", "S2-")
         test = doper.Doper(test_specie)
@@ -5,9 +5,13 @@ from __future__ import annotations
 import itertools
 import json
 import logging
+import multiprocessing
 import os
 import pickle
+import shutil
+import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from importlib.util import find_spec
 from operator import itemgetter
@@ -27,10 +31,31 @@ from pymatgen.core import SETTINGS
 
 import smact
 from smact import Species
-from smact.structure_prediction.database import StructureDB
+from smact.structure_prediction.database import (
+    StructureCache,
+    StructureDB,
+    _decorate_mprest_chunk,
+    _imap_chunked,
+    parse_mprest,
+)
 from smact.structure_prediction.mutation import CationMutator
 from smact.structure_prediction.prediction import StructurePredictor
-from smact.structure_prediction.structure import SmactStructure
+from smact.structure_prediction.structure import (
+    DecorationError,
+    MutatedStructure,
+    SmactStructure,
+    decorate_many,
+    deduplicate,
+    py_struct_digest,
+)
+from smact.structure_prediction.utilities import (
+    charge_pattern,
+    parse_spec,
+    prototype_key,
+    species_from_id,
+    species_id,
+    unparse_spec,
+)
 
 MP_URL = "https://api.materialsproject.org"
 MP_API_AVAILABLE = bool(find_spec("mp_api"))
@@ -66,6 +91,25 @@ def generate_test_structure(comp: str) -> bool:
     return True
 
 
+# Database of the worker processes of PredictorTest.test_predict_structs_batch_persistent,
+# and the pooled connection it had when the worker was forked
+_fork_db = None
+_fork_inherited = None
+
+
+def _init_fork_worker(db: StructureDB) -> None:
+    global _fork_db, _fork_inherited
+    _fork_db = db
+    _fork_inherited = getattr(db._local, "pooled", None)
+
+
+def _fork_worker_connection(_) -> tuple[bool, bool]:
+    """Get whether a forked worker inherited a pooled connection, and whether it used it."""
+    with _fork_db as c:
+        c.execute("SELECT 1")
+        return _fork_inherited is not None, c.connection is _fork_inherited
+
+
 @contextmanager
 def ignore_warnings(logger: logging.Logger) -> int:
     """Ignore logging warnings."""
@@ -111,6 +155,44 @@ class StructureTest(unittest.TestCase):
                     struct = SmactStructure.from_file(comp_file)
                     self.assertEqual(struct.as_poscar(), f.read())
 
+    def test_as_bytes(self):
+        """Test the binary encoding round trip."""
+        for comp in self.TEST_SPECIES:
+            struct = SmactStructure.from_file(os.path.join(files_dir, f"{comp}.txt"))
+            for compress in (False, True):
+                with self.subTest(comp=comp, compress=compress):
+                    decoded = SmactStructure.from_bytes(struct.as_bytes(compress=compress))
+                    self.assertEqual(decoded, struct)
+                    self.assertEqual(decoded.as_poscar(), struct.as_poscar())
+
+        with pytest.raises(ValueError, match="version"):
+            SmactStructure.from_bytes(b"SMS\xff\x00")
+        with pytest.raises(ValueError, match="not an encoded structure"):
+            SmactStructure.from_bytes(struct.as_poscar().encode())
+
+    def test_site_arrays(self):
+        """Test the array storage of sites and the compatibility view."""
+        struct = SmactStructure.from_file(os.path.join(files_dir, "CaTiO3.txt"))
+        self.assertEqual(struct.coords.shape, (10, 3))
+        self.assertEqual(struct.coords.dtype, np.float64)
+        np.testing.assert_array_equal(struct.site_species, [0, 0, 1, 1, 1, 1, 1, 1, 2, 2])
+        self.assertEqual(list(struct.sites), struct.get_spec_strs())
+        self.assertEqual(struct.sites["Ti4+"], [[0.0, 0.0, 3.89611961], [0.0, 0.0, 0.0]])
+
+        rebuilt = SmactStructure(struct.species, struct.lattice_mat, struct.sites, sanitise_species=False)
+        self.assertEqual(rebuilt, struct)
+
+        # Interleaving species within the arrays does not matter
+        order = np.array([8, 2, 0, 3, 9, 4, 5, 1, 6, 7])
+        shuffled = SmactStructure.from_arrays(
+            struct.species, struct.lattice_mat, struct.coords[order], struct.site_species[order]
+        )
+        self.assertEqual(shuffled, struct)
+        self.assertEqual(shuffled.as_poscar(), struct.as_poscar())
+
+        with pytest.raises(ValueError):
+            SmactStructure.from_arrays(struct.species, struct.lattice_mat, struct.coords, [0, 1])
+
     @staticmethod
     def _gen_empty_structure(species):
         """Generate an empty set of arguments for `SmactStructure` testing."""
@@ -164,6 +246,32 @@ class StructureTest(unittest.TestCase):
 
         self.assertStructAlmostEqual(s1, s2)
 
+    def test_decorate_many(self):
+        """Test decorating many pymatgen Structures with oxidation states."""
+        py_structs = [
+            pymatgen.core.Structure.from_file(os.path.join(files_dir, f))
+            for f in ["CaTiO3.json", "NaCl.json", "Fe.json", "CaTiO3.json"]
+        ]
+        self.assertEqual(py_struct_digest(py_structs[0]), py_struct_digest(py_structs[3]))
+        self.assertNotEqual(py_struct_digest(py_structs[0]), py_struct_digest(py_structs[1]))
+
+        decorated = decorate_many(py_structs)
+        self.assertEqual(decorated[0], SmactStructure.from_py_struct(py_structs[0]))
+        self.assertEqual(decorated[1], SmactStructure.from_py_struct(py_structs[1]))
+        self.assertIsInstance(decorated[2], DecorationError)
+        self.assertEqual(decorated[3], decorated[0])
+
+        # Failures are cached too
+        with pytest.raises(DecorationError):
+            SmactStructure.from_py_struct(py_structs[2])
+
+        parallel = decorate_many(py_structs, num_processes=2, chunksize=1)
+        self.assertEqual(parallel[:2], decorated[:2])
+        self.assertEqual(str(parallel[2]), str(decorated[2]))
+
+        with pytest.raises(ValueError):
+            decorate_many(py_structs, method="oracle")
+
     def test_has_species(self):
         """Test determining whether a species is in a `SmactStructure`."""
         s1 = SmactStructure(*self._gen_empty_structure([("Ba", 2, 2), ("O", -2, 1), ("F", -1, 2)]))
@@ -267,6 +375,64 @@ class StructureTest(unittest.TestCase):
         self.assertEqual(s1.reduced_formula(), "CaTiO3")
         self.assertEqual(s2.reduced_formula(), "NaCl")
 
+        # Polyanions and special formulas follow pymatgen
+        for species, formula in [
+            ([("Ca", 2, 3), ("O", -2, 8), ("P", 5, 2)], "Ca3(PO4)2"),
+            ([("Li", 1, 1), ("O", -1, 1)], "Li2O2"),
+        ]:
+            struct = SmactStructure(species, *self._gen_empty_structure(species)[1:])
+            self.assertEqual(struct.reduced_formula(), formula)
+
+    def test_formula_keys(self):
+        """Test the chemical system and anonymized formula against pymatgen."""
+        for comp in self.TEST_SPECIES:
+            with self.subTest(comp=comp):
+                struct = SmactStructure.from_file(os.path.join(files_dir, f"{comp}.txt"))
+                composition = struct.as_py_struct().composition
+                self.assertEqual(struct.reduced_formula(), composition.reduced_formula)
+                self.assertEqual(struct.chemical_system(), composition.chemical_system)
+                self.assertEqual(struct.anonymized_formula(), composition.anonymized_formula)
+
+    def test_fingerprint(self):
+        """Test structure fingerprints and deduplication."""
+        struct = SmactStructure.from_file(os.path.join(files_dir, "CaTiO3.txt"))
+        fingerprint = struct.fingerprint()
+
+        # Invariant to site order, uniform scaling, small displacements and,
+        # with Niggli reduction, the choice of unit cell
+        order = np.random.default_rng(0).permutation(len(struct.coords))
+        supercell_basis = np.array([[1, 0, 0], [0, 1, 0], [1, 0, 1]])
+        equivalents = [
+            SmactStructure.from_arrays(
+                struct.species, struct.lattice_mat, struct.coords[order], struct.site_species[order]
+            ),
+            SmactStructure.from_arrays(
+                struct.species, 1.1 * struct.lattice_mat, 1.1 * struct.coords, struct.site_species
+            ),
+            SmactStructure.from_arrays(struct.species, struct.lattice_mat, struct.coords + 1e-6, struct.site_species),
+            SmactStructure.from_arrays(
+                struct.species, supercell_basis @ struct.lattice_mat, struct.coords, struct.site_species
+            ),
+        ]
+        for equivalent in equivalents:
+            self.assertEqual(equivalent.fingerprint(), fingerprint)
+        self.assertNotEqual(equivalents[-1].fingerprint(niggli=False), struct.fingerprint(niggli=False))
+
+        BaTiO3 = SmactStructure.from_file(os.path.join(files_dir, "BaTiO3.txt"))
+        self.assertNotEqual(BaTiO3.fingerprint(), fingerprint)
+
+        # Mutations share the geometry of their parent
+        mutator = CationMutator.from_json(TEST_LAMBDA_JSON)
+        mutation = mutator._mutate_structure(struct, "Ca2+", "Ba2+")
+        self.assertEqual(mutation.fingerprint(), BaTiO3.fingerprint())
+
+        structs = [struct, *equivalents, mutation, BaTiO3]
+        self.assertEqual(list(deduplicate(structs)), [struct, mutation])
+        self.assertEqual(list(deduplicate(structs, recheck=True)), [struct, *equivalents, mutation])
+
+        items = list(enumerate(structs))
+        self.assertEqual(list(deduplicate(items, key=itemgetter(1))), [items[0], items[5]])
+
 
 class StructureDBTest(unittest.TestCase):
     """Test StructureDB interface."""
@@ -275,12 +441,33 @@ class StructureDBTest(unittest.TestCase):
     TEST_TABLE = "Structures"
     TEST_MP_TABLE = "Structures1"
 
+    @classmethod
+    def setUpClass(cls):
+        """Load the test structures."""
+        cls.structs = [SmactStructure.from_file(os.path.join(files_dir, f"{x}.txt")) for x in ["CaTiO3", "NaCl", "Fe"]]
+
     @classmethod
     def tearDownClass(cls):
         """Remove database files."""
         if os.path.exists(cls.TEST_DB):
             os.remove(cls.TEST_DB)
 
+    def _make_db(self, cache_size: int = 0, *, legacy: bool = False) -> StructureDB:
+        """
+        Create an in-memory database with an empty test table, closed after the test.
+
+        If `legacy` is True, the table is created as by older versions,
+        without an id column or species and prototype tables.
+        """
+        db = StructureDB(":memory:", persistent=True, cache_size=cache_size)
+        self.addCleanup(db.close)
+        if legacy:
+            with db as c:
+                c.execute(f"CREATE TABLE {self.TEST_TABLE} (composition TEXT NOT NULL, structure TEXT NOT NULL)")
+        else:
+            db.add_table(self.TEST_TABLE)
+        return db
+
     def test_db_interface(self):
         """Test interfacing with database."""
         with self.subTest(msg="Instantiating database."):
@@ -354,6 +541,299 @@ class StructureDBTest(unittest.TestCase):
             added: int = self.db.add_mp_icsd(self.TEST_MP_TABLE, mp_data)
             self.assertEqual(added, 3)
 
+        with self.subTest(msg="Testing re-adding MP structures."):
+            fe_struct = pymatgen.core.Structure.from_file(os.path.join(files_dir, "Fe.json"))
+            mp_data.append({"material_id": "mp-13", "structure": fe_struct})
+            self.assertEqual(self.db.add_mp_icsd(self.TEST_MP_TABLE, mp_data), 0)
+
+            # Changed structures are replaced, and data can be streamed
+            mp_data[1] = {"material_id": "mp-22862", "structure": mp_strucs[1].scale_lattice(50.0)}
+            self.assertEqual(self.db.add_mp_icsd(self.TEST_MP_TABLE, (entry for entry in mp_data)), 1)
+
+            with self.db as c:
+                c.execute(f"SELECT COUNT(*) FROM {self.TEST_MP_TABLE}")
+                self.assertEqual(c.fetchone()[0], 3)
+                c.execute(
+                    f"SELECT material_id, structure_id IS NULL, error IS NULL FROM {self.TEST_MP_TABLE}_decorations"
+                    " ORDER BY material_id"
+                )
+                self.assertEqual(
+                    c.fetchall(),
+                    [("mp-13", 1, 0), ("mp-19306", 0, 1), ("mp-22862", 0, 1), ("mp-4019", 0, 1)],
+                )
+
+    def test_decorate_mprest_chunk(self):
+        """Test that failing to rebuild or decorate a structure is recorded, not raised."""
+        struct = pymatgen.core.Structure.from_file(os.path.join(files_dir, "NaCl.json"))
+        species = [site.species for site in struct]
+        entries = [
+            ("mp-1", "a", struct.lattice.matrix, species, struct.frac_coords),
+            ("mp-2", "b", struct.lattice.matrix, species[:1], struct.frac_coords),
+        ]
+        (id_1, digest_1, decorated, error_1), (id_2, digest_2, failed, error_2) = _decorate_mprest_chunk(entries, "BV")
+        self.assertEqual((id_1, digest_1, error_1), ("mp-1", "a", None))
+        self.assertIsInstance(decorated, SmactStructure)
+        self.assertEqual((id_2, digest_2, failed), ("mp-2", "b", None))
+        self.assertIn("StructureError", error_2)
+
+        self.assertEqual(parse_mprest({"material_id": "mp-1", "structure": struct}), decorated)
+        fe_struct = pymatgen.core.Structure.from_file(os.path.join(files_dir, "Fe.json"))
+        with self.assertLogs(smact.structure_prediction.logger, logging.WARNING):
+            self.assertIsNone(parse_mprest({"material_id": "mp-13", "structure": fe_struct}))
+
+    def test_imap_chunked(self):
+        """Test streaming chunks of work through a bounded process pool."""
+        consumed = []
+
+        def items():
+            for i in range(100):
+                consumed.append(i)
+                yield i
+
+        for num_processes in (1, 2):
+            with self.subTest(num_processes=num_processes):
+                consumed.clear()
+                results = _imap_chunked(sorted, items(), num_processes=num_processes, chunksize=3, max_pending=2)
+                self.assertEqual(next(results), 0)
+                # Only the chunks in flight, and the next one, have been read
+                self.assertLessEqual(len(consumed), 3 * 3)
+                self.assertEqual(list(results), list(range(1, 100)))
+
+    def test_index_species(self):
+        """Test migrating a table without a species table."""
+        db = self._make_db(legacy=True)
+        structs = self.structs
+
+        # A table as created by older versions
+        with db as c:
+            for struct in structs:
+                c.execute(f"INSERT into {self.TEST_TABLE} VALUES (?, ?)", (struct.composition(), struct.as_poscar()))
+
+        queries = [[("Na", 1)], [("O", -2), ("Ca", 2)], [("Fe", 0)], [("Na", 1), ("Cl", 1)], []]
+        scanned = [db.get_with_species(spec, self.TEST_TABLE) for spec in queries]
+        self.assertEqual(scanned[:4], [[structs[1]], [structs[0]], [structs[2]], []])
+
+        self.assertEqual(db.index_species(self.TEST_TABLE), 3)
+        self.assertEqual(db.index_species(self.TEST_TABLE), 0)
+        with db as c:
+            species_rows = c.execute(f"SELECT * FROM {self.TEST_TABLE}_species ORDER BY structure_id").fetchall()
+        self.assertEqual(species_rows[:3], [(1, "Ca", 2, 1), (1, "O", -2, 3), (1, "Ti", 4, 1)])
+
+        self.assertEqual([db.get_with_species(spec, self.TEST_TABLE) for spec in queries], scanned)
+
+        # New structures are added to the species table
+        db.add_struct(structs[1], self.TEST_TABLE)
+        self.assertEqual(db.get_with_species([("Cl", -1)], self.TEST_TABLE), [structs[1]] * 2)
+
+    def test_index_species_vacuum(self):
+        """Test that migrated tables keep their structure ids through VACUUM."""
+        db = self._make_db(legacy=True)
+        structs = self.structs
+
+        # A table as created by older versions, with a gap in its rowids
+        with db as c:
+            for struct in structs:
+                c.execute(f"INSERT into {self.TEST_TABLE} VALUES (?, ?)", (struct.composition(), struct.as_poscar()))
+            c.execute(f"DELETE FROM {self.TEST_TABLE} WHERE rowid = 1")
+
+        self.assertEqual(db.index_species(self.TEST_TABLE), 2)
+        with db as c:
+            c.execute("VACUUM")
+            self.assertEqual(c.execute(f"SELECT id FROM {self.TEST_TABLE} ORDER BY id").fetchall(), [(2,), (3,)])
+
+        self.assertEqual(db.get_with_species([("Na", 1)], self.TEST_TABLE), [structs[1]])
+        self.assertEqual(db.get_with_species([("Fe", 0)], self.TEST_TABLE), [structs[2]])
+        self.assertEqual(db.get_with_species([("O", -2)], self.TEST_TABLE), [])
+
+    def test_bulk_add_structs(self):
+        """Test adding structures in batches."""
+        db = self._make_db()
+        structs = self.structs
+
+        progress = []
+        added = db.add_structs(
+            [*structs, None] * 5,
+            self.TEST_TABLE,
+            commit_after_each=True,
+            batch_size=4,
+            defer_indexes=True,
+            progress=lambda num, rate: progress.append(num),
+        )
+        self.assertEqual(added, 15)
+        self.assertEqual(progress, [4, 8, 12, 15])
+        self.assertEqual(db.get_with_species([("Na", 1)], self.TEST_TABLE), [structs[1]] * 5)
+
+        def failing_structs():
+            yield from structs
+            raise RuntimeError
+
+        with pytest.raises(RuntimeError):
+            db.add_structs(failing_structs(), self.TEST_TABLE, defer_indexes=True)
+        with db as c:
+            indexes = c.execute(f"PRAGMA index_list({self.TEST_TABLE}_species)").fetchall()
+            (count,) = c.execute(f"SELECT COUNT(*) FROM {self.TEST_TABLE}").fetchone()
+        self.assertEqual(len(indexes), 2)
+        self.assertEqual(count, 15)
+
+    def test_binary_structures(self):
+        """Test storing structures in the binary encoding."""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        db = StructureDB(os.path.join(tmp_dir.name, "structures.db"))
+        db.add_table(self.TEST_TABLE)
+        structs = self.structs
+        db.add_structs(structs, self.TEST_TABLE)
+
+        self.assertEqual(db.convert_structures(self.TEST_TABLE, batch_size=2), 3)
+        self.assertEqual(db.convert_structures(self.TEST_TABLE), 0)
+        with db as c:
+            types = c.execute(f"SELECT typeof(structure) FROM {self.TEST_TABLE}").fetchall()
+        self.assertEqual(types, [("blob",)] * 3)
+
+        binary_db = StructureDB(db.db, structure_format="binary", compress=True)
+        binary_db.add_struct(structs[1], self.TEST_TABLE)
+
+        self.assertEqual(db.get_with_species([("Na", 1)], self.TEST_TABLE), [structs[1]] * 2)
+        self.assertEqual(db.get_structs(structs[0].composition(), self.TEST_TABLE), [structs[0]])
+
+        self.assertEqual(db.convert_structures(self.TEST_TABLE, "poscar"), 4)
+        self.assertEqual(db.get_with_species([("Na", 1)], self.TEST_TABLE), [structs[1]] * 2)
+
+        with pytest.raises(ValueError):
+            StructureDB(":memory:", structure_format="cif")
+
+    def test_get_with_species_many(self):
+        """Test getting structures containing several sets of species at once."""
+        db = self._make_db()
+        structs = self.structs
+        db.add_structs([*structs, structs[1]], self.TEST_TABLE)
+
+        queries = [[("Na", 1)], [("O", -2), ("Ca", 2)], [("Na", 1), ("Cl", -1)], [("Na", 1), ("Cl", 1)], []]
+        expected = [db.get_with_species(list(spec), self.TEST_TABLE) for spec in queries]
+        results = db.get_with_species_many(queries, self.TEST_TABLE)
+        self.assertEqual(results, expected)
+        self.assertEqual(db.get_with_species_many([], self.TEST_TABLE), [])
+
+        # Structures matching several sets are only decoded once
+        self.assertIs(results[0][0], results[2][0])
+        self.assertIs(results[0][1], results[4][3])
+
+        # The same matches are found by scanning compositions
+        with db as c:
+            c.execute(f"DROP TABLE {self.TEST_TABLE}_species")
+        db._species_tables.clear()
+        self.assertEqual(db.get_with_species_many(queries, self.TEST_TABLE), expected)
+
+    def test_get_with_prototype(self):
+        """Test getting structures by their anonymised charges and stoichiometry."""
+        db = self._make_db()
+        BaTiO3 = SmactStructure.from_file(os.path.join(files_dir, "BaTiO3.txt"))
+        structs = [*self.structs[:2], BaTiO3, self.structs[2]]
+        db.add_structs(structs, self.TEST_TABLE)
+
+        queries = [([-2, 4, 2], None), ([2, 4, -2], [1, 1, 3]), ([2, 4, -2], [1, 1, 2]), ([1, -1], None), ([0], [2])]
+        expected = [[structs[0], structs[2]], [structs[0], structs[2]], [], [structs[1]], [structs[3]]]
+        results = [db.get_with_prototype(charges, self.TEST_TABLE, stoichiometry=stoics) for charges, stoics in queries]
+        self.assertEqual(results, expected)
+        self.assertEqual(db.get_with_prototype([1, -1], self.TEST_TABLE, return_ids=True), [(2, structs[1])])
+
+        # Tables without a prototype table are scanned, until indexed
+        with db as c:
+            c.execute(f"DROP TABLE {self.TEST_TABLE}_prototypes")
+        db._species_tables.clear()
+        scanned = [db.get_with_prototype(charges, self.TEST_TABLE, stoichiometry=stoics) for charges, stoics in queries]
+        self.assertEqual(scanned, expected)
+
+        db.index_species(self.TEST_TABLE)
+        with db as c:
+            self.assertEqual(c.execute(f"SELECT COUNT(*) FROM {self.TEST_TABLE}_prototypes").fetchone(), (4,))
+        self.assertEqual(db.get_with_prototype([2, 4, -2], self.TEST_TABLE), [structs[0], structs[2]])
+
+    def test_structure_cache(self):
+        """Test caching decoded structures."""
+        db = self._make_db(cache_size=2)
+        structs = self.structs
+        db.add_structs(structs, self.TEST_TABLE)
+
+        (nacl,) = db.get_with_species([("Na", 1)], self.TEST_TABLE)
+        self.assertEqual(nacl, structs[1])
+        self.assertIs(db.get_structs(structs[1].composition(), self.TEST_TABLE)[0], nacl)
+        self.assertEqual(db.cache.stats()["hits"], 1)
+        self.assertEqual(db.cache.stats()["hit_rate"], 0.5)
+
+        # All three structures, with room for two
+        self.assertEqual(db.get_with_species([], self.TEST_TABLE), structs)
+        self.assertEqual(db.cache.stats()["structs"], 2)
+        self.assertEqual(db.cache.evictions, 1)
+
+        # A replaced structure is not served from the cache
+        with db as c:
+            c.execute(f"DELETE FROM {self.TEST_TABLE} WHERE rowid = 3")
+        db.add_struct(structs[1], self.TEST_TABLE)
+        self.assertEqual(db.get_with_species([("Na", 1)], self.TEST_TABLE), [structs[1]] * 2)
+
+        db.invalidate_cache()
+        self.assertEqual(len(db.cache), 0)
+
+        bounded = StructureCache(max_structs=10, max_bytes=1)
+        bounded.put(self.TEST_TABLE, 1, structs[0])
+        self.assertEqual(len(bounded), 0)
+
+    def test_persistent_connections(self):
+        """Test reusing per-thread connections."""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        db = StructureDB(os.path.join(tmp_dir.name, "structures.db"), persistent=True)
+        self.addCleanup(db.close)
+        db.add_table(self.TEST_TABLE)
+        structs = self.structs
+        db.add_structs(structs, self.TEST_TABLE)
+
+        with db as c:
+            conn = c.connection
+            self.assertEqual(c.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        with db as c:
+            self.assertIs(c.connection, conn)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda spec: db.get_with_species(spec, self.TEST_TABLE), [[("Na", 1)]] * 8))
+        self.assertEqual(results, [[structs[1]]] * 8)
+
+        db.close()
+        self.assertEqual(db.get_with_species([("O", -2)], self.TEST_TABLE), [structs[0]])
+
+
+class SpeciesTableTest(unittest.TestCase):
+    """Test the interned species table."""
+
+    def test_parse_spec(self):
+        for species, expected in [("Fe2+", ("Fe", 2)), ("O2-", ("O", -2)), ("Na+", ("Na", 1)), ("Cl-", ("Cl", -1))]:
+            with self.subTest(species=species):
+                self.assertEqual(parse_spec(species), expected)
+                # Cached result
+                self.assertEqual(parse_spec(species), expected)
+
+    def test_species_id(self):
+        self.assertEqual(species_id("Fe2+"), species_id("Fe2+"))
+        self.assertEqual(species_id("Na+"), species_id("Na1+"))
+        self.assertNotEqual(species_id("Fe2+"), species_id("Fe3+"))
+        self.assertEqual(species_from_id(species_id("Fe3+")), ("Fe", 3))
+
+    def test_unparse_spec(self):
+        self.assertEqual(unparse_spec(("Fe", 2)), "Fe2+")
+        self.assertEqual(unparse_spec(("Na", 1), include_one=False), "Na+")
+        self.assertEqual(unparse_spec(("Na", 1)), "Na1+")
+        self.assertEqual(unparse_spec(("O", -2)), "O2-")
+
+    def test_prototype_key(self):
+        self.assertEqual(charge_pattern([-2, 4, 2]), "4+ 2+ 2-")
+        self.assertEqual(charge_pattern([0]), "0")
+        self.assertEqual(
+            prototype_key([("Ca", 2, 1), ("O", -2, 3), ("Ti", 4, 1)]),
+            prototype_key([("Sr", 2, 2), ("Sn", 4, 2), ("S", -2, 6)]),
+        )
+        self.assertEqual(prototype_key([("Fe", 2, 1), ("Fe", 3, 2), ("O", -2, 4)]), "3+:2 2+:1 2-:4")
+
 
 class CationMutatorTest(unittest.TestCase):
     """Test the CationMutator class."""
@@ -389,6 +869,60 @@ class CationMutatorTest(unittest.TestCase):
             check_names=False,
         )
 
+    def test_lambda_tab_pop_alpha_func(self):
+        """Test populating a partial lambda table with an alpha function."""
+        lambda_df = pd.DataFrame(
+            [[0.5, np.nan], [np.nan, 0.3]],
+            index=["A", "B"],
+            columns=["B", "C"],
+        )
+        alpha_vals = {frozenset("AA"): -1.0, frozenset("AC"): -2.0, frozenset("BB"): -3.0, frozenset("CC"): -4.0}
+
+        cm = CationMutator(lambda_df, alpha=lambda s1, s2: alpha_vals[frozenset((s1, s2))])
+
+        exp_lambda = pd.DataFrame(
+            [
+                [-1.0, 0.5, -2.0],
+                [0.5, -3.0, 0.3],
+                [-2.0, 0.3, -4.0],
+            ],
+            index=["A", "B", "C"],
+            columns=["A", "B", "C"],
+        )
+
+        assert_frame_equal(cm.lambda_tab, exp_lambda)
+        self.assertEqual(cm.get_lambda("C", "A"), -2.0)
+
+    def test_lambda_tab_pop_alpha_value(self):
+        """Test populating a partial lambda table with a constant alpha."""
+        lambda_df = pd.DataFrame([[0.5]], index=["A"], columns=["B"])
+
+        for alpha, expected in [(-2.0, -2.0), (None, -5.0)]:
+            with self.subTest(alpha=alpha):
+                cm = CationMutator(lambda_df, alpha=alpha)
+                self.assertEqual(cm.get_lambda("A", "A"), expected)
+                self.assertEqual(cm.get_lambda("A", "B"), 0.5)
+
+        with pytest.raises(ValueError, match="alpha"):
+            CationMutator(lambda_df, alpha="low")
+
+    def test_save_load(self):
+        """Test the binary lambda table round trip."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "test_lambda.npz")
+            self.test_mutator.save(path)
+
+            for mmap in [True, False]:
+                with self.subTest(mmap=mmap):
+                    cm = CationMutator.load(path, mmap=mmap)
+                    assert_frame_equal(cm.lambda_tab, self.test_mutator.lambda_tab, check_names=False)
+                    self.assertEqual(cm.specs, self.test_mutator.specs)
+                    self.assertAlmostEqual(cm.Z, self.test_mutator.Z)
+                    self.assertEqual(cm.get_lambda("A", "D"), -5.0)
+
+            with pytest.raises(TypeError):
+                CationMutator(self.test_mutator.lambda_tab, alpha=lambda s1, s2: -5.0).save(path)
+
     def test_partition_func_Z(self):
         """Test the partition function for the whole table."""
         # 2e^0.5 + 2e^0.3 + 5e^{-5} \approx 6.0308499
@@ -430,6 +964,53 @@ class CationMutatorTest(unittest.TestCase):
 
         # TODO Confirm functionality with more complex substitutions
 
+    def test_mutated_structure(self):
+        """Test the view of a structure returned by a mutation."""
+        CaTiO3 = SmactStructure.from_file(os.path.join(files_dir, "CaTiO3.txt"))
+        BaTiO3 = SmactStructure.from_file(os.path.join(files_dir, "BaTiO3.txt"))
+
+        mutation = self.test_mutator._mutate_structure(CaTiO3, "Ca2+", "Ba2+")
+        self.assertIsInstance(mutation, MutatedStructure)
+        self.assertIs(mutation.lattice_mat, CaTiO3.lattice_mat)
+        self.assertIs(mutation.coords, CaTiO3.coords)
+        self.assertEqual(mutation.sites["Ba2+"], CaTiO3.sites["Ca2+"])
+        self.assertEqual(SmactStructure.from_bytes(mutation.as_bytes()), BaTiO3)
+
+        # Reassigning attributes leaves the parent untouched
+        mutation.lattice_param = 2.0
+        self.assertEqual(CaTiO3.lattice_param, 1.0)
+        self.assertEqual(mutation.lattice_param, 2.0)
+
+        materialized = mutation.materialize()
+        self.assertNotIsInstance(materialized, MutatedStructure)
+        self.assertIsNot(materialized.coords, CaTiO3.coords)
+        materialized.coords[0, 0] += 1.0
+        self.assertEqual(CaTiO3, SmactStructure.from_file(os.path.join(files_dir, "CaTiO3.txt")))
+
+        # Mutations of a view, and swapping species
+        swapped = self.test_mutator._nary_mutate_structure(mutation, ["Ba2+", "Ti4+"], ["Ti4+", "Ba2+"])
+        self.assertEqual(swapped.get_spec_strs(), BaTiO3.get_spec_strs())
+        self.assertIs(swapped.coords, CaTiO3.coords)
+        self.assertEqual(swapped.sites["Ti4+"], CaTiO3.sites["Ca2+"])
+        self.assertEqual(swapped.sites["Ba2+"], CaTiO3.sites["Ti4+"])
+
+    def test_unary_substitute(self):
+        """Test generating all single substitutions of a structure."""
+        CaTiO3 = SmactStructure.from_file(os.path.join(files_dir, "CaTiO3.txt"))
+        thresh = 1e-3
+
+        expected = []
+        for specie in CaTiO3.get_spec_strs():
+            for new_spec, prob in self.test_pymatgen_mutator.cond_sub_probs(specie).items():
+                if new_spec != specie and parse_spec(new_spec)[1] == parse_spec(specie)[1] and prob > thresh:
+                    expected.append((prob, specie, new_spec))
+
+        substitutions = list(self.test_pymatgen_mutator.unary_substitute(CaTiO3, thresh))
+        self.assertEqual([tuple(sub[1:]) for sub in substitutions], expected)
+        for struct, _, specie, new_spec in substitutions:
+            self.assertIn(new_spec, struct.get_spec_strs())
+            self.assertNotIn(specie, struct.get_spec_strs())
+
     def test_sub_prob(self):
         """Test determining substitution probabilities."""
         for s1, s2 in self.test_pairs:
@@ -439,6 +1020,20 @@ class CationMutatorTest(unittest.TestCase):
                     self.test_pymatgen_mutator.sub_prob(s1, s2),
                 )
 
+    def test_sub_probs_matrix(self):
+        """Test batched substitution probability lookups."""
+        rows = ["A", "C"]
+        cols = ["B", "C", "A"]
+        mat = self.test_mutator.sub_probs_matrix(rows, cols)
+
+        self.assertEqual(mat.shape, (2, 3))
+        for (i, s1), (j, s2) in itertools.product(enumerate(rows), enumerate(cols)):
+            with self.subTest(s1=s1, s2=s2):
+                self.assertAlmostEqual(mat[i, j], self.test_mutator.sub_prob(s1, s2))
+
+        with pytest.raises(ValueError):
+            self.test_mutator.sub_probs_matrix(["A"], ["D"])
+
     def test_cond_sub_probs(self):
         """Test determining conditional substitution probabilities for a row."""
         for s1 in ["A", "B", "C"]:
@@ -453,6 +1048,26 @@ class CationMutatorTest(unittest.TestCase):
                 # Slice to convert to series
                 assert_series_equal(cond_sub_probs_test, test_df.iloc[0])
 
+    def test_cond_sub_probs_many(self):
+        """Test determining conditional substitution probabilities for several rows."""
+        cond_probs = self.test_mutator.cond_sub_probs_many(["C", "A"])
+
+        self.assertEqual(list(cond_probs.index), ["C", "A"])
+        for s1 in ["A", "C"]:
+            with self.subTest(s=s1):
+                assert_series_equal(cond_probs.loc[s1], self.test_mutator.cond_sub_probs(s1))
+
+    def test_cache_invalidation(self):
+        """Test that cached normalisations are refreshed when the lambda table changes."""
+        cm = CationMutator.from_json(lambda_json=TEST_LAMBDA_JSON)
+        old_cond_prob = cm.cond_sub_prob("A", "B")
+
+        cm.lambda_tab = cm.lambda_tab * 2
+
+        self.assertAlmostEqual(cm.Z, np.exp(cm.lambda_tab.to_numpy()).sum())
+        self.assertEqual(cm.get_lambda("A", "B"), 1.0)
+        self.assertNotAlmostEqual(cm.cond_sub_prob("A", "B"), old_cond_prob)
+
     def test_cond_sub_prob(self):
         """Test determining conditional substitution probabilities."""
         for s1, s2 in self.test_pairs:
@@ -598,3 +1213,99 @@ class PredictorTest(unittest.TestCase):
             for p1, p2 in zip(probs, expected_probs, strict=False):
                 with self.subTest(p1=p1, p2=p2):
                     self.assertAlmostEqual(p1, p2)
+
+    def test_predict_structs_batch(self):
+        """Test predicting structures for many targets at once."""
+        sp = StructurePredictor(self.cm, self.db, self.table)
+        targets = [
+            [("Ca", 2), ("Ti", 4), ("O", -2)],
+            [("Sr", 2), ("Ti", 4), ("O", -2)],
+            [("Ca", 2), ("Sn", 4), ("O", -2)],
+            [("Na", 1), ("Cl", -1)],
+        ]
+
+        with self.db as c:
+            rows = c.execute(f"SELECT rowid, structure FROM {self.table}").fetchall()
+        parents = {rowid: SmactStructure.from_poscar(poscar).composition() for rowid, poscar in rows}
+
+        expected = sorted(
+            (tuple(target), struct.composition(), p, parent.composition())
+            for target in targets
+            for struct, p, parent in sp.predict_structs(list(target), thresh=0.01)
+        )
+        for num_processes in (1, 2):
+            with self.subTest(num_processes=num_processes):
+                records = list(sp.predict_structs_batch(targets, thresh=0.01, num_processes=num_processes, chunksize=2))
+                results = sorted(
+                    (target, struct.composition(), p, parents[parent_id]) for target, struct, p, parent_id in records
+                )
+                self.assertEqual(results, expected)
+
+    def test_predict_structs_batch_persistent(self):
+        """Test that forked workers do not use the pooled connections of the parent."""
+        targets = [[("Ca", 2), ("Ti", 4), ("O", -2)], [("Na", 1), ("Cl", -1)]]
+        serial = StructurePredictor(self.cm, self.db, self.table)
+        expected = sorted(
+            (target, struct.composition(), p, parent_id)
+            for target, struct, p, parent_id in serial.predict_structs_batch(targets, thresh=0.01)
+        )
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = StructureDB(shutil.copy(TEST_PREDICTOR_DB, tmp_dir), persistent=True)
+            self.addCleanup(db.close)
+
+            # Open a pooled connection in the parent before forking
+            with db as c:
+                c.execute(f"SELECT COUNT(*) FROM {self.table}")
+
+            with multiprocessing.get_context("fork").Pool(2, _init_fork_worker, (db,)) as pool:
+                self.assertEqual(pool.map(_fork_worker_connection, range(2)), [(True, False)] * 2)
+
+            sp = StructurePredictor(self.cm, db, self.table)
+            records = sp.predict_structs_batch(targets, thresh=0.01, num_processes=2, chunksize=1)
+            results = sorted((target, struct.composition(), p, parent_id) for target, struct, p, parent_id in records)
+            self.assertEqual(results, expected)
+            db.close()
+
+    def test_predict_top_k(self):
+        """Test predicting only the most likely structures."""
+        sp = StructurePredictor(self.cm, self.db, self.table)
+        test_specs = [("Ca", 2), ("Ti", 4), ("O", -2)]
+
+        predictions = list(sp.predict_structs(list(test_specs), thresh=1e-3))
+        predictions.sort(key=itemgetter(1), reverse=True)
+        for top_k in (0, 1, 4, len(predictions) + 1):
+            with self.subTest(top_k=top_k):
+                top = list(sp.predict_structs(list(test_specs), thresh=1e-3, top_k=top_k))
+                self.assertEqual([p for _, p, _ in top], [p for _, p, _ in predictions[:top_k]])
+                for struct, p, parent in top:
+                    self.assertIn((struct, p, parent), predictions)
+
+    def test_nary_prediction(self):
+        """Test predicting structures by substituting several species."""
+        sp = StructurePredictor(self.cm, self.db, self.table)
+        test_specs = [("Sr", 2), ("Zr", 4), ("O", -2)]
+
+        for n_ary in (1, 2, 3):
+            predictions = list(sp.nary_predict_structs(list(test_specs), n_ary=n_ary, thresh=1e-7, include_same=False))
+            self.assertTrue(predictions)
+            for struct, p, parent in predictions:
+                with self.subTest(n_ary=n_ary, parent=parent.composition()):
+                    self.assertEqual(struct.get_spec_strs(), ["O2-", "Sr2+", "Zr4+"])
+                    parent_strs = parent.get_spec_strs()
+                    alt_spec = [spec for spec in parent_strs if spec not in struct.get_spec_strs()]
+                    diff_spec = [spec for spec in struct.get_spec_strs() if spec not in parent_strs]
+                    self.assertEqual(len(alt_spec), n_ary)
+
+                    # The most likely charge-neutral assignment of species to sites
+                    stoics = {spec: stoic for spec, (_, _, stoic) in zip(parent_strs, parent.species, strict=True)}
+                    best = max(
+                        np.prod([self.cm.cond_sub_prob(new, old) for old, new in zip(perm, diff_spec, strict=True)])
+                        for perm in itertools.permutations(alt_spec)
+                        if sum(
+                            stoics[old] * (parse_spec(new)[1] - parse_spec(old)[1])
+                            for old, new in zip(perm, diff_spec, strict=True)
+                        )
+                        == 0
+                    )
+                    self.assertAlmostEqual(p, best)